@@ -144,11 +144,8 @@ class DiscordTelegramParser:
             if removed_servers:
                 logger.info(f"   🗑️ Removing topics for deleted servers: {len(removed_servers)}")
                 for server in removed_servers:
-                    if server in self.telegram_bot.server_topics:
-                        old_topic_id = self.telegram_bot.server_topics[server]
-                        del self.telegram_bot.server_topics[server]
-                        if old_topic_id in self.telegram_bot.topic_name_cache:
-                            del self.telegram_bot.topic_name_cache[old_topic_id]
+                    old_topic_id = self.telegram_bot._drop_topic(server)
+                    if old_topic_id is not None:
                         logger.info(f"      • Removed {server} (topic {old_topic_id})")
                 
                 if removed_servers:
@@ -407,6 +404,9 @@ class DiscordTelegramParser:
             # Stop new server handler
             if self.new_server_handler:
                 self.new_server_handler.stop()
+            
+            # Дописываем отложенные изменения топиков/сообщений на диск
+            self.telegram_bot.flush_data()
                 
         except Exception as e:
             error_msg = str(e).encode('utf-8', 'replace').decode('utf-8')
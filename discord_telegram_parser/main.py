@@ -1,8 +1,14 @@
 import requests
-import json
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import random
+import functools
+import argparse
 from datetime import datetime
-from time import sleep
+from time import sleep, monotonic
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 from translatepy.translators.google import GoogleTranslate
 from discord_telegram_parser.models.message import Message
@@ -11,12 +17,21 @@ from discord_telegram_parser.config.settings import config
 class DiscordParser:
     def __init__(self):
         self.sessions = []
-        self.gtranslate = GoogleTranslate()
+        self.max_rate_limit_retries = 8
+        self.page_size = 10
+        # Предзагрузка следующей страницы, пока разбирается текущая
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="discord-prefetch")
+        
+        # (token_index, channel_id) -> monotonic-время, до которого токен не пробуем (401/403)
+        self._denied_tokens = {}
+        self.denied_token_ttl = 3600
         
         # Initialize sessions for each token
         for token in config.DISCORD_TOKENS:
             session = requests.Session()
             session.headers['authorization'] = token
+            # Один keep-alive пул на discord.com; повторы делает сам парсер (429 / ротация токенов)
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=Retry(total=0)))
             
             # Verify token permissions
             try:
@@ -24,7 +39,7 @@ class DiscordParser:
                 if r.status_code != 200:
                     raise Exception(f"Invalid token (HTTP {r.status_code})")
                     
-                user_info = json.loads(r.text)
+                user_info = orjson.loads(r.content)
                 print(f"Using token for: {user_info.get('username')}")
                 
                 # Check guild permissions
@@ -38,55 +53,96 @@ class DiscordParser:
                 
             self.sessions.append(session)
     
+    @functools.cached_property
+    def gtranslate(self):
+        """Google translator, created on first use"""
+        return GoogleTranslate()
+
+    def _usable_token(self, channel_id, start=0):
+        """Index of the first token (cyclically from start) not denied access to the channel recently"""
+        now = monotonic()
+        total = len(self.sessions)
+        for offset in range(total):
+            index = (start + offset) % total
+            expires_at = self._denied_tokens.get((index, channel_id))
+            if expires_at is None or expires_at <= now:
+                return index
+        return None
+
     def parse_announcement_channel(self, channel_id, server_name=None, channel_name=None, limit=10):
         """Parse the last N messages from an announcement channel with token rotation"""
         messages = []
-        token_index = 0
+        token_index = self._usable_token(channel_id)
+        if token_index is None:
+            logger.warning(f"All tokens were recently denied access to channel {channel_id}, skipping")
+            return messages
+        errors = 0
         has_more = True
         last_id = None
         count = 0
+        rate_limit_attempts = 0
+        
+        # Не зависят от сообщения - считаем один раз, а не на каждое сообщение
+        server = server_name.encode('utf-8', 'replace').decode('utf-8') if server_name else None
+        channel = channel_name.encode('utf-8', 'replace').decode('utf-8') if channel_name else None
+        messages_append = messages.append
+        fromisoformat = datetime.fromisoformat
+        _Message = Message
+        page_size = self.page_size
+        url = f'https://discord.com/api/v9/channels/{channel_id}/messages'
+        prefetched = None
         
         while has_more:
             session = self.sessions[token_index]
             try:
-                # Fetch messages in batches of 10
-                params = {'limit': min(10, limit - count) if limit else 10}
-                if last_id:
-                    params['before'] = last_id
-                    
                 # Stop if we've reached the limit
                 if limit and count >= limit:
                     break
-                    
-                r = session.get(
-                    f'https://discord.com/api/v9/channels/{channel_id}/messages',
-                    params=params
-                )
+                
+                if prefetched is not None:
+                    # Страница уже запрошена, пока разбиралась предыдущая
+                    # Сбрасываем до result(): упавший запрос не должен повторно бросать исключение
+                    future, prefetched = prefetched, None
+                    r = future.result()
+                else:
+                    # Fetch messages in batches of page_size
+                    params = {'limit': min(page_size, limit - count) if limit else page_size}
+                    if last_id:
+                        params['before'] = last_id
+                    r = session.get(url, params=params)
                 
                 if r.status_code == 200:
-                    batch = r.json()
+                    rate_limit_attempts = 0
+                    errors = 0
+                    batch = orjson.loads(r.content)
                     if not batch:
                         has_more = False
                         break
+                    
+                    # Следующая страница нужна, только если эта полная и лимит не набран
+                    remaining = limit - count - len(batch) if limit else page_size
+                    if remaining > 0 and len(batch) >= page_size:
+                        prefetched = self._prefetch_pool.submit(
+                            session.get,
+                            url,
+                            params={'limit': min(page_size, remaining), 'before': batch[-1]['id']}
+                        )
                         
                     # Process messages in reverse chronological order (newest first)
                     for msg in batch:
-                        msg_time = datetime.fromisoformat(msg['timestamp'])
+                        msg_time = fromisoformat(msg['timestamp'])
                         
                         # Sanitize message content
                         content = msg['content'].encode('utf-8', 'replace').decode('utf-8')
                         author = msg['author']['username'].encode('utf-8', 'replace').decode('utf-8')
-                        server = server_name.encode('utf-8', 'replace').decode('utf-8') if server_name else None
-                        channel = channel_name.encode('utf-8', 'replace').decode('utf-8') if channel_name else None
                         
-                        message = Message(
+                        messages_append(_Message(
                             content=content,
                             timestamp=msg_time,
                             server_name=server,
                             channel_name=channel,
                             author=author
-                        )
-                        messages.append(message)
+                        ))
                         last_id = msg['id']
                         count += 1
                         
@@ -97,37 +153,60 @@ class DiscordParser:
                     # If we broke early due to timestamp, exit
                     if not has_more:
                         break
-                        
-                    sleep(0.2)  # Avoid rate limits
                     
                 elif r.status_code == 429:  # Rate limited
-                    retry_after = r.headers.get('Retry-After', 5)
-                    logger.warning(f"Rate limited - retrying in {retry_after}s")
-                    sleep(int(retry_after))
+                    rate_limit_attempts += 1
+                    if rate_limit_attempts > self.max_rate_limit_retries:
+                        logger.error(f"Rate limited {rate_limit_attempts - 1} times in a row for channel {channel_id}, giving up")
+                        break
+                    
+                    # Ждём не меньше Retry-After, но с ростом попыток - экспоненциально дольше (+ джиттер)
+                    retry_after = float(r.headers.get('Retry-After') or r.json().get('retry_after', 1))
+                    backoff = max(retry_after, min(0.5 * 2 ** (rate_limit_attempts - 1), 30))
+                    delay = backoff + random.uniform(0, 0.25 * rate_limit_attempts)
+                    logger.warning(f"Rate limited - retrying in {delay:.2f}s (attempt {rate_limit_attempts})")
+                    sleep(delay)
                     continue
                     
-                elif r.status_code == 403:
+                elif r.status_code in (401, 403):
                     logger.error(f"Access denied to channel {channel_id}")
-                    # Rotate token
-                    token_index = (token_index + 1) % len(self.sessions)
+                    # Токен не пробуем для этого канала denied_token_ttl секунд
+                    self._denied_tokens[(token_index, channel_id)] = monotonic() + self.denied_token_ttl
+                    token_index = self._usable_token(channel_id, token_index + 1)
+                    if token_index is None:
+                        logger.error(f"No token has access to channel {channel_id}")
+                        break
                     logger.info(f"Rotating to token {token_index}")
                     continue
                     
                 else:
                     error_details = r.json().get('message', 'Unknown error')
                     logger.error(f"Failed to fetch messages (HTTP {r.status_code}): {error_details}")
+                    errors += 1
+                    if errors >= len(self.sessions):
+                        break
                     # Rotate token
-                    token_index = (token_index + 1) % len(self.sessions)
+                    token_index = self._usable_token(channel_id, token_index + 1)
                     logger.info(f"Rotating to token {token_index}")
                     
             except Exception as e:
                 logger.error(f"Error parsing channel {channel_id}: {e}")
+                errors += 1
+                if errors >= len(self.sessions):
+                    break
+                # Предзагрузка шла через старый токен - отбрасываем её, повтор пойдёт с last_id
+                if prefetched is not None:
+                    prefetched.cancel()
+                    prefetched = None
                 # Rotate token on any exception
-                token_index = (token_index + 1) % len(self.sessions)
+                token_index = self._usable_token(channel_id, token_index + 1)
                 logger.info(f"Rotating to token {token_index} after exception")
                 
-        # Return messages in chronological order (oldest first)
-        return sorted(messages, key=lambda x: x.timestamp)
+        # Return messages in chronological order (oldest first).
+        # Discord отдаёт страницы от новых к старым, а каждая следующая страница старше
+        # предыдущей (before=last_id) - список уже строго убывает, сортировка не нужна
+        messages.reverse()
+        return messages
         
     def sanitize_string(self, s):
         """Helper to fix encoding issues"""
@@ -135,17 +214,35 @@ class DiscordParser:
     
     def save_messages(self, messages, filename='messages.json'):
         """Save messages to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump([msg.__dict__ for msg in messages], f, indent=2, default=str)
+        # orjson сериализует dataclass и datetime сам - без промежуточных dict и default=str
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(messages, option=orjson.OPT_INDENT_2))
         logger.success(f"Saved {len(messages)} messages to {filename}")
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Fetch recent messages from Discord announcement channels")
+    arg_parser.add_argument('--channel', action='append', dest='channels', metavar='CHANNEL_ID',
+                            help="announcement channel ID (repeat for several channels)")
+    arg_parser.add_argument('--server', help="server name to attach to the messages")
+    arg_parser.add_argument('--limit', type=int, default=10, help="messages per channel (default: 10)")
+    arg_parser.add_argument('--output', default='messages.json', help="output file (default: messages.json)")
+    args = arg_parser.parse_args()
+    
     parser = DiscordParser()
     
-    # Example usage - would be replaced with proper channel discovery
-    channel_id = input("Enter announcement channel ID: ")
-    server_name = input("Enter server name (optional): ")
-    channel_name = input("Enter channel name (optional): ")
+    if args.channels:
+        # Каналы независимы - читаем их параллельно через общий keep-alive пул
+        with ThreadPoolExecutor(max_workers=min(len(args.channels), 8)) as pool:
+            batches = pool.map(
+                lambda channel_id: parser.parse_announcement_channel(channel_id, args.server, limit=args.limit),
+                args.channels
+            )
+            messages = [message for batch in batches for message in batch]
+    else:
+        # Без --channel - старый интерактивный режим
+        channel_id = input("Enter announcement channel ID: ")
+        server_name = input("Enter server name (optional): ") or args.server
+        channel_name = input("Enter channel name (optional): ")
+        messages = parser.parse_announcement_channel(channel_id, server_name, channel_name, limit=args.limit)
     
-    messages = parser.parse_announcement_channel(channel_id, server_name, channel_name)
-    parser.save_messages(messages)
+    parser.save_messages(messages, args.output)
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from loguru import logger
 from discord_telegram_parser.models.message import Message
 from discord_telegram_parser.config.settings import config
+from discord_telegram_parser.utils.channel_id_parser import first_announcement_channel, is_announcement_channel
 
 class DiscordWebSocketService:
     def __init__(self, telegram_bot=None):
@@ -105,24 +106,25 @@ class DiscordWebSocketService:
                     await self.close_forum_topic(old_topic_id)
                     
                     # Обновляем mapping на новый топик
-                    if clean_name in self.telegram_bot.server_topics:
-                        if self.telegram_bot.server_topics[clean_name] == old_topic_id:
-                            self.telegram_bot.server_topics[clean_name] = topic_id
-                            logger.info(f"🔄 Updated topic mapping for '{clean_name}': {old_topic_id} -> {topic_id}")
+                    if self.telegram_bot.server_topics.get(clean_name) == old_topic_id:
+                        self.telegram_bot._set_topic(clean_name, topic_id)
+                        logger.info(f"🔄 Updated topic mapping for '{clean_name}': {old_topic_id} -> {topic_id}")
                 
                 topic_names[clean_name] = topic_id
             
             # Синхронизируем с нашим кэшем
+            missing = []
             for server_name, cached_topic_id in list(self.telegram_bot.server_topics.items()):
                 if server_name in topic_names:
                     actual_topic_id = topic_names[server_name]
                     if cached_topic_id != actual_topic_id:
                         logger.info(f"🔄 Syncing topic for '{server_name}': {cached_topic_id} -> {actual_topic_id}")
-                        self.telegram_bot.server_topics[server_name] = actual_topic_id
+                        self.telegram_bot._set_topic(server_name, actual_topic_id)
                 else:
                     # Топик не существует в Telegram, удаляем из кэша
                     logger.warning(f"🗑️ Removing non-existent topic from cache: '{server_name}' -> {cached_topic_id}")
-                    del self.telegram_bot.server_topics[server_name]
+                    missing.append(server_name)
+            self.telegram_bot._drop_topics(missing)
             
             self.telegram_bot._save_data()
             logger.success(f"✅ Topic verification complete. Active topics: {len(self.telegram_bot.server_topics)}")
@@ -363,13 +365,8 @@ class DiscordWebSocketService:
             logger.info(f"🔍 Processing channels for guild: {guild_name}")
             
             # Find first channel with name ending in "announcement" or "announcements"
-            announcement_channels = []
-            for channel in channels_in_guild:
-                lower_name = channel['name'].lower()
-                if (lower_name.endswith('announcement') or 
-                    lower_name.endswith('announcements')):
-                    announcement_channels.append(channel)
-                    break  # Only keep first match
+            first = first_announcement_channel(channels_in_guild)
+            announcement_channels = [first] if first else []
             
             if not announcement_channels:
                 logger.info(f"ℹ️ No announcement channels found in {guild_name}")
@@ -560,10 +557,8 @@ class DiscordWebSocketService:
             channels = guild.get('channels', [])
             for channel in channels:
                 if channel['id'] == channel_id:
-                    lower_name = channel['name'].lower()
-                    if (lower_name.endswith('announcement') or 
-                        lower_name.endswith('announcements')):
-                        return True
+                    # ID канала уникален - дальше искать незачем
+                    return is_announcement_channel(channel)
         return False
     
     async def handle_new_message(self, message_data):
@@ -694,7 +689,7 @@ class DiscordWebSocketService:
             )
             
             if sent_msg:
-                self.telegram_bot.message_mappings[str(message.timestamp)] = sent_msg.message_id
+                self.telegram_bot.record_message_mapping(str(message.timestamp), sent_msg.message_id)
                 self.telegram_bot._save_data()
                 
                 topic_info = f" to topic {topic_id}" if topic_id else " as regular message"
@@ -1,79 +1,414 @@
 import telebot
-from typing import List, Dict
+from typing import List, Dict, Optional
+from dataclasses import dataclass
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
 from discord_telegram_parser.models.message import Message
 from discord_telegram_parser.config.settings import config
-import json
+from discord_telegram_parser.utils.rate_limiter import TokenBucket
 import os
+import orjson
+import base64
+import binascii
+import struct
+import re
+import sys
 import time
 import threading
 import asyncio
+import functools
+import operator
+import itertools
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 
+# Шаблон экрана статуса (заполняется через str.format_map)
+_STATUS_TEMPLATE = (
+    "📊 Bot Status\n\n"
+    "🔹 Topics Support: {topics_support}\n"
+    "🔹 Active Topics: {active_topics}\n"
+    "🔹 Configured Servers: {configured_servers}\n"
+    "🔹 Total Channels: {total_channels}\n"
+    "🔹 Message Cache: {message_cache} messages\n"
+    "🔹 WebSocket Channels: {websocket_channels}\n"
+    "🛡️ Anti-Duplicate Protection: {protection}\n"
+    "🔹 Topic Logic: One server = One topic ✅\n"
+    "🔹 Startup Verification: {verification}\n\n"
+    "📋 Current Topics:\n"
+)
+
+_SERVERS_LIST_TEMPLATE = (
+    "📋 Select a server to view announcements:\n\n"
+    "📊 {server_count} servers configured, {topic_count} topics created\n"
+    "📋 = Has topic, ❌ = Invalid topic, 🆕 = New server\n"
+    "🛡️ Anti-duplicate protection: {protection}"
+)
+
+_BY_TIMESTAMP = operator.attrgetter('timestamp')
+
+# Шаблоны format_message: с/без канала, с/без времени
+_MESSAGE_TMPL_TS = "📢 #{channel}\n📅 {ts}\n👤 {author}\n💬 {content}"
+_MESSAGE_TMPL_TS_NO_CHANNEL = "📅 {ts}\n👤 {author}\n💬 {content}"
+_MESSAGE_TMPL = "📢 #{channel}\n👤 {author}\n💬 {content}"
+_MESSAGE_TMPL_NO_CHANNEL = "👤 {author}\n💬 {content}"
+
+# Лимит текста одного сообщения Telegram (в символах, с запасом до 4096)
+_TG_TEXT_LIMIT = 4000
+_BATCH_SEPARATOR = "\n\n"
+
+# "Too Many Requests: retry after 5" из ответа Telegram
+_RETRY_AFTER_RE = re.compile(r'retry after (\d+)')
+
+def _iter_chunks(text, size):
+    """Yield consecutive size-character slices of text (Telegram counts characters, not bytes)"""
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+# Discord snowflake ID: только ASCII-цифры, 17-20 символов
+_SNOWFLAKE_RE = re.compile(r'^[0-9]{17,20}\Z')
+
+# Кандидат на channel ID (любое число) - длину проверяет _SNOWFLAKE_RE
+_CHANNEL_ID_INPUT_RE = re.compile(r'^\s*[0-9]+\s*$')
+
+# Шаблоны экрана добавления канала (str.format)
+_ADD_CHANNEL_INSTRUCTIONS_TMPL = (
+    "➕ **Adding Channel to {server_name}**\n\n"
+    "🔹 Please send the Discord channel ID\n"
+    "🔹 Example: `1234567890123456789`\n\n"
+    "📝 **How to get channel ID:**\n"
+    "1. Enable Developer Mode in Discord\n"
+    "2. Right-click on the channel\n"
+    "3. Click 'Copy ID'\n\n"
+    "⚠️ Make sure the bot has access to this channel!"
+)
+
+_CHANNEL_CONFIRM_TMPL = (
+    "🔍 **Channel Information**\n\n"
+    "Server: {server_name}\n"
+    "Channel ID: `{channel_id}`\n"
+    "Channel Name: {channel_name}\n\n"
+    "➕ Add this channel to monitoring?"
+)
+
+@functools.lru_cache(maxsize=512)
+def _build_cancel_markup(server_name):
+    """Cancel button for the add-channel flow (shared, do not mutate)"""
+    markup = InlineKeyboardMarkup()
+    markup.add(InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_add_{server_name}"))
+    return markup
+
+# Компактный токен подтверждения: (action:u8, server_idx:u16, channel_id:u64) -> 16 символов base64
+_CB_TOKEN = struct.Struct('<BHQ')
+# Пределы полей токена: индекс сервера - unsigned short, channel ID - unsigned 64 бита
+_CB_MAX_SERVER_IDX = 0xFFFF
+_CB_MAX_CHANNEL_ID = 2 ** 64 - 1
+_CB_CONFIRM_ADD = 1
+
+def _encode_confirm_token(server_idx, channel_id):
+    """Pack a confirm-add callback token (server index + numeric channel ID)"""
+    raw = _CB_TOKEN.pack(_CB_CONFIRM_ADD, server_idx, int(channel_id))
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_confirm_token(token):
+    """Unpack a confirm-add callback token into (server_idx, channel_id), or None if malformed"""
+    try:
+        action, server_idx, channel_id = _CB_TOKEN.unpack(base64.urlsafe_b64decode(token))
+    except (binascii.Error, struct.error, ValueError):
+        return None
+    if action != _CB_CONFIRM_ADD:
+        return None
+    return server_idx, str(channel_id)
+
+@functools.lru_cache(maxsize=512)
+def _build_confirm_markup(server_name, server_idx, channel_id):
+    """Confirm/Cancel buttons for the add-channel flow (shared, do not mutate)"""
+    markup = InlineKeyboardMarkup()
+    markup.add(
+        InlineKeyboardButton(
+            "✅ Confirm",
+            callback_data=f"confirm_add_{_encode_confirm_token(server_idx, channel_id)}"
+        ),
+        InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_add_{server_name}")
+    )
+    return markup
+
+@dataclass(slots=True)
+class PendingAddChannel:
+    """User is adding a channel to a server and we wait for its channel ID"""
+    server_name: str
+    chat_id: int
+    message_id: int
+    channel_name: Optional[str] = None
+
 class TelegramBotService:
     def __init__(self, bot_token: str):
-        self.bot = telebot.TeleBot(bot_token)
+        # Обработчики выполняются в пуле воркеров telebot, чтобы сетевые вызовы
+        # разных callback'ов перекрывались, а не шли строго по одному
+        self.bot = telebot.TeleBot(bot_token, threaded=True, num_threads=8)
         self.bot.skip_pending = True
-        self.bot.threaded = True
         self.network_timeout = 30
         self.message_store = 'telegram_messages.json'
+        self._show_timestamps = config.TELEGRAM_UI_PREFERENCES['show_timestamps']
+        # message_mappings дописываются построчно (NDJSON), а не переписываются целиком
+        self.mappings_log = 'telegram_messages.ndjson'
         self.user_states = {}
         self.server_topics = {}  # server_name -> topic_id mapping
         self.topic_name_cache = {}  # topic_id -> server_name mapping для быстрого поиска
+        self.topic_by_name = {}  # название топика -> topic_id (топики называются по серверу)
+        
+        # Индекс серверов в виде параллельных списков (первый канал каждого сервера)
+        self._server_names = []
+        self._server_first_channel_id = []
+        self._server_first_channel_name = []
+        self._server_name_to_idx = {}
+        
         self.websocket_service = None
-        self.topic_creation_lock = threading.Lock()
+        # server_name -> Event текущего создания топика (один создатель на сервер)
+        self._pending_creations = {}
+        self._creations_lock = threading.Lock()
+        # Запись server_topics/topic_name_cache - только через _set_topic/_drop_topic (copy-on-write)
+        self._topics_write_lock = threading.Lock()
         
         # Новые атрибуты для предотвращения дублей
-        self.startup_verification_done = False
+        self._startup_done = threading.Event()
+        self._startup_lock = threading.Lock()
         self.topic_sync_lock = threading.Lock()
         
+        # Пул для долгих операций из callback'ов (не блокируем polling-воркер)
+        self._cb_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tg-callback")
+        # Отдельный пул для ack'ов, чтобы их не задерживали долгие задачи в _cb_pool
+        self._ack_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tg-ack")
+        # Проактивное ограничение отправки (лимиты Telegram): ~25 сообщений/с всего и ~1/с на чат
+        self._global_bucket = TokenBucket(25, 1)
+        self._chat_buckets = {}
+        
+        # Параллельная отправка групп разных серверов (ограничено, чтобы не упереться в лимиты Telegram)
+        self._send_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tg-send")
+        # Максимум одновременных get_forum_topic при массовой проверке топиков
+        self._probe_concurrency = 20
+        
+        # TTL-кэш проверок топиков: key -> (expires_at, result); один запрос на ключ за раз
+        self._topic_exists_cache = {}
+        self._topic_exists_ttl = 60
+        # chat_id -> поддерживает ли чат топики; живёт до /verify_topics
+        self._forum_chats = {}
+        
+        # chat_id -> (expires_at, текст экрана статуса)
+        self._status_cache = {}
+        self._status_ttl = 5
+        
+        # (channel_id, limit) -> (expires_at, последние сообщения канала) для кнопки Get Messages
+        self._recent_messages = {}
+        self._recent_messages_ttl = 5
+        self._probe_locks = defaultdict(threading.Lock)
+        
+        # (chat_id, message_id) -> (hash последнего отрисованного (text, markup), его номер версии)
+        # для пропуска одинаковых и устаревших правок
+        self._last_edit = OrderedDict()
+        self._last_edit_max = 256
+        # Воркеры telebot и поток правок делят _last_edit: set/move/evict должны идти вместе
+        self._last_edit_lock = threading.Lock()
+        # Номер версии правки: чем больше, тем новее отрисовка экрана
+        self._edit_seq = itertools.count()
+        # Правки одного сообщения не идут параллельно (сообщение -> одна из полос)
+        self._edit_stripes = [threading.Lock() for _ in range(32)]
+        
+        # Отложенные правки: (chat_id, message_id) -> последняя версия, сбрасываются фоновым потоком
+        self._edit_queue = {}
+        self._edit_queue_lock = threading.Lock()
+        self._edit_queue_max = 256
+        self._edit_flush_interval = 0.3
+        
+        # channel_id -> (expires_at, {'name', 'type'} или None) для Discord /channels/{id}
+        self._channel_info_cache = {}
+        self._channel_info_cache_max = 4096
+        # Воркеры telebot пишут в кэш параллельно: pop/insert/evict идут под одной блокировкой
+        self._channel_info_lock = threading.Lock()
+        self._channel_info_ttl = 900
+        self._channel_info_miss_ttl = 60
+        
+        # Отложенное сохранение: мутации ставят флаг, фоновый поток пишет файл
+        self._persist_dirty = threading.Event()
+        self._persist_lock = threading.Lock()
+        self._persist_interval = 2
+        
+        self._mappings_lock = threading.Lock()
+        self._mappings_fp = None
+        self._mappings_log_lines = 0
+        
         # Load existing data
         self._load_data()
+        
+        threading.Thread(target=self._persistence_worker, daemon=True).start()
     
     def _load_data(self):
         """Load message mappings and topic mappings"""
+        legacy_mappings = {}
         if os.path.exists(self.message_store):
             try:
-                with open(self.message_store, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.message_mappings = data.get('messages', {})
-                    self.server_topics = data.get('topics', {})
+                with open(self.message_store, 'rb') as f:
+                    data = orjson.loads(f.read())
+                    # 'messages' есть только в файлах старого формата - переносим их в лог
+                    legacy_mappings = data.get('messages', {})
+                    # Интернируем имена серверов: одни и те же строки во всех словарях
+                    self.server_topics = {sys.intern(k): v for k, v in data.get('topics', {}).items()}
                     
                     # Создаем обратный кэш для быстрого поиска
                     self.topic_name_cache = {v: k for k, v in self.server_topics.items()}
+                    self.topic_by_name = dict(self.server_topics)
                     
                     logger.info(f"📋 Loaded {len(self.server_topics)} topic mappings from cache")
             except Exception as e:
                 logger.error(f"Error loading data: {e}")
-                self.message_mappings = {}
                 self.server_topics = {}
                 self.topic_name_cache = {}
+                self.topic_by_name = {}
         else:
-            self.message_mappings = {}
             self.server_topics = {}
             self.topic_name_cache = {}
+            self.topic_by_name = {}
+        
+        # Старые файлы могли хранить message_id строками - приводим к int
+        self.message_mappings = {k: int(v) for k, v in legacy_mappings.items()}
+        self._replay_mappings_log()
+        
+        if legacy_mappings:
+            # Миграция: пишем маппинги в лог, основной файл перезапишется уже без 'messages'
+            self._compact_mappings_log()
+            self._save_data()
+        else:
+            self._mappings_fp = open(self.mappings_log, 'ab')
+
+    def _replay_mappings_log(self):
+        """Apply the NDJSON mappings log on top of message_mappings"""
+        if not os.path.exists(self.mappings_log):
+            return
+        
+        mappings = self.message_mappings
+        loads = orjson.loads
+        decode_error = orjson.JSONDecodeError
+        lines = 0
+        offset = 0
+        torn_tail = None
+        with open(self.mappings_log, 'rb') as f:
+            for line in f:
+                start = offset
+                offset += len(line)
+                try:
+                    record = loads(line)
+                except decode_error:
+                    # Недописанная строка после аварийного завершения
+                    if not line.endswith(b'\n'):
+                        torn_tail = start
+                    continue
+                # orjson сохраняет тип: mid уже int, повторная валидация не нужна
+                mappings[record['ts']] = record['mid']
+                lines += 1
+        
+        if torn_tail is not None:
+            # Обрезаем хвост, иначе следующая запись в режиме 'ab' склеится с ним
+            with open(self.mappings_log, 'rb+') as f:
+                f.truncate(torn_tail)
+        elif offset and not line.endswith(b'\n'):
+            # Последняя запись цела, но без перевода строки
+            with open(self.mappings_log, 'ab') as f:
+                f.write(b'\n')
+        self._mappings_log_lines = lines
+        logger.info(f"📋 Loaded {len(self.message_mappings)} message mappings from log")
+
+    def _compact_mappings_log(self):
+        """Rewrite the mappings log with one line per mapping"""
+        with self._mappings_lock:
+            tmp_path = self.mappings_log + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(
+                    orjson.dumps({'ts': ts, 'mid': mid}) + b'\n'
+                    for ts, mid in list(self.message_mappings.items())
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            
+            if self._mappings_fp:
+                self._mappings_fp.close()
+            os.replace(tmp_path, self.mappings_log)
+            self._mappings_fp = open(self.mappings_log, 'ab')
+            self._mappings_log_lines = len(self.message_mappings)
+
+    def record_message_mapping(self, timestamp_key: str, message_id: int):
+        """Remember which Telegram message a Discord message was sent as"""
+        self.message_mappings[timestamp_key] = message_id
+        line = orjson.dumps({'ts': timestamp_key, 'mid': message_id}) + b'\n'
+        with self._mappings_lock:
+            self._mappings_fp.write(line)
+            self._mappings_log_lines += 1
 
     def _save_data(self):
-        """Save message mappings and topic mappings"""
-        try:
-            with open(self.message_store, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'messages': self.message_mappings,
-                    'topics': self.server_topics
-                }, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Error saving data: {e}")
+        """Schedule saving of message mappings and topic mappings (non-blocking)"""
+        self._persist_dirty.set()
+
+    def _write_data(self):
+        """Write topic mappings to disk atomically and flush the message mappings log"""
+        with self._persist_lock:
+            self._persist_dirty.clear()
+            try:
+                # message_mappings уже в NDJSON-логе: сбрасываем буфер, при разрастании - сжимаем
+                with self._mappings_lock:
+                    self._mappings_fp.flush()
+                if self._mappings_log_lines > 2 * len(self.message_mappings) + 1000:
+                    self._compact_mappings_log()
+                
+                # server_topics не мутируется на месте (copy-on-write) - копия не нужна
+                snapshot = {'topics': self.server_topics}
+                
+                tmp_path = self.message_store + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(snapshot))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.message_store)
+            except Exception as e:
+                logger.error(f"Error saving data: {e}")
+
+    def _persistence_worker(self):
+        """Background writer: flushes pending changes at most once per persist interval"""
+        while True:
+            self._persist_dirty.wait()
+            self._write_data()
+            time.sleep(self._persist_interval)
+
+    def flush_data(self):
+        """Write pending changes immediately (used on shutdown)"""
+        if self._persist_dirty.is_set():
+            self._write_data()
+
+    @property
+    def startup_verification_done(self):
+        """True once startup topic verification has finished"""
+        return self._startup_done.is_set()
 
     def startup_topic_verification(self, chat_id=None):
         """Проверка топиков при запуске для предотвращения дублей"""
-        if self.startup_verification_done:
+        if self._startup_done.is_set():
             return
-            
+        
+        # Выполняет один поток; остальные ждут события, а не блокировку
+        if not self._startup_lock.acquire(blocking=False):
+            self._startup_done.wait()
+            return
+        
+        try:
+            if not self._startup_done.is_set():  # Двойная проверка
+                self._verify_topics_once(chat_id)
+        finally:
+            # Сначала событие, потом блокировка: иначе в промежутке другой поток
+            # запустит вторую проверку, а поздний set() отменит новую (/verify_topics)
+            self._startup_done.set()
+            self._startup_lock.release()
+
+    def _verify_topics_once(self, chat_id=None):
+        """Body of startup_topic_verification (runs in a single thread)"""
         with self.topic_sync_lock:
-            if self.startup_verification_done:  # Двойная проверка
-                return
-                
             chat_id = chat_id or config.TELEGRAM_CHAT_ID
             
             logger.info("🔍 Starting startup topic verification to prevent duplicates...")
@@ -81,15 +416,17 @@ class TelegramBotService:
             try:
                 if not self._check_if_supergroup_with_topics(chat_id):
                     logger.info("ℹ️ Chat doesn't support topics, skipping verification")
-                    self.startup_verification_done = True
                     return
                 
                 # Получаем все существующие топики (через попытку отправки тестового сообщения)
                 existing_valid_topics = {}
                 invalid_topics = []
                 
-                for server_name, topic_id in list(self.server_topics.items()):
-                    if self._topic_exists(chat_id, topic_id):
+                topic_items = list(self.server_topics.items())
+                exists = self._topics_exist_bulk(chat_id, [tid for _, tid in topic_items], use_cache=False)
+                
+                for server_name, topic_id in topic_items:
+                    if exists[topic_id]:
                         # Проверяем на дубли по названию
                         topic_name = f"{server_name}"
                         
@@ -107,11 +444,10 @@ class TelegramBotService:
                             except Exception as e:
                                 logger.warning(f"⚠️ Could not close duplicate topic {old_topic_id}: {e}")
                             
-                            # Удаляем старый из кэша
-                            for srv_name, srv_topic_id in list(self.server_topics.items()):
-                                if srv_topic_id == old_topic_id:
-                                    del self.server_topics[srv_name]
-                                    break
+                            # Удаляем старый из кэша (обратный индекс topic_id -> server)
+                            old_server = self.topic_name_cache.get(old_topic_id)
+                            if old_server is not None:
+                                self._drop_topic(old_server)
                         
                         existing_valid_topics[topic_name] = topic_id
                         
@@ -120,14 +456,8 @@ class TelegramBotService:
                         invalid_topics.append(server_name)
                 
                 # Удаляем недействительные топики из кэша
-                for server_name in invalid_topics:
-                    if server_name in self.server_topics:
-                        old_topic_id = self.server_topics[server_name]
-                        del self.server_topics[server_name]
-                        logger.info(f"🗑️ Removed invalid topic mapping: {server_name} -> {old_topic_id}")
-                
-                # Пересоздаем обратный кэш
-                self.topic_name_cache = {v: k for k, v in self.server_topics.items()}
+                for server_name, old_topic_id in self._drop_topics(invalid_topics).items():
+                    logger.info(f"🗑️ Removed invalid topic mapping: {server_name} -> {old_topic_id}")
                 
                 # Сохраняем изменения
                 if invalid_topics or len(existing_valid_topics) != len(self.server_topics):
@@ -138,26 +468,52 @@ class TelegramBotService:
                 logger.info(f"   🗑️ Removed invalid: {len(invalid_topics)}")
                 logger.info(f"   🛡️ Duplicate protection: ACTIVE")
                 
-                self.startup_verification_done = True
-                
             except Exception as e:
                 logger.error(f"❌ Error during startup verification: {e}")
-                self.startup_verification_done = True
 
     def _check_if_supergroup_with_topics(self, chat_id):
-        """Check if the chat supports topics"""
-        try:
-            chat = self.bot.get_chat(chat_id)
-            return chat.type == 'supergroup' and getattr(chat, 'is_forum', False)
-        except Exception as e:
-            logger.debug(f"Error checking chat type: {e}")
-            return False
+        """Check if the chat supports topics (cached per chat until the next verification)"""
+        is_forum = self._forum_chats.get(chat_id)
+        if is_forum is not None:
+            return is_forum
+        
+        with self._probe_locks[('chat', chat_id)]:
+            is_forum = self._forum_chats.get(chat_id)
+            if is_forum is not None:
+                return is_forum
+            try:
+                chat = self.bot.get_chat(chat_id)
+            except Exception as e:
+                # Ошибки не кэшируем - повторим при следующем вызове
+                logger.debug(f"Error checking chat type: {e}")
+                return False
+            is_forum = chat.type == 'supergroup' and getattr(chat, 'is_forum', False)
+            self._forum_chats[chat_id] = is_forum
+            return is_forum
 
-    def _topic_exists(self, chat_id, topic_id):
-        """Check if a specific topic exists using Telegram API"""
+    def _topic_exists(self, chat_id, topic_id, use_cache=True):
+        """Check if a specific topic exists (cached for _topic_exists_ttl seconds unless use_cache=False)"""
         if not topic_id:
             return False
-            
+        
+        key = (chat_id, topic_id)
+        if use_cache:
+            cached = self._topic_exists_cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+        
+        # Один запрос на ключ: остальные потоки ждут и берут результат из кэша
+        with self._probe_locks[key]:
+            if use_cache:
+                cached = self._topic_exists_cache.get(key)
+                if cached and cached[0] > time.monotonic():
+                    return cached[1]
+            exists = self._probe_topic(chat_id, topic_id)
+            self._topic_exists_cache[key] = (time.monotonic() + self._topic_exists_ttl, exists)
+            return exists
+
+    def _probe_topic(self, chat_id, topic_id):
+        """Check if a specific topic exists using Telegram API"""
         try:
             # Пытаемся получить информацию о топике
             topic_info = self.bot.get_forum_topic(
@@ -173,30 +529,42 @@ class TelegramBotService:
         except Exception:
             return False
 
+    def _topics_exist_bulk(self, chat_id, topic_ids, use_cache=True) -> Dict[int, bool]:
+        """Probe many topics concurrently (bounded); returns topic_id -> exists"""
+        unique_ids = list(dict.fromkeys(topic_ids))
+        if len(unique_ids) <= 1:
+            return {tid: self._topic_exists(chat_id, tid, use_cache) for tid in unique_ids}
+        
+        with ThreadPoolExecutor(max_workers=min(self._probe_concurrency, len(unique_ids))) as pool:
+            results = pool.map(lambda tid: self._topic_exists(chat_id, tid, use_cache), unique_ids)
+            return dict(zip(unique_ids, results))
+
     def get_server_topic_id(self, server_name: str):
         """Get existing topic ID for server (safe for real-time use)"""
         # Проверяем кэш при первом запуске
-        if not self.startup_verification_done:
+        if not self._startup_done.is_set():
             self.startup_topic_verification()
         
-        # Быстрая проверка кэша без блокировки
-        if server_name in self.server_topics:
-            topic_id = self.server_topics[server_name]
+        # Быстрая проверка кэша без блокировки (один атомарный get)
+        topic_id = self.server_topics.get(server_name)
+        if topic_id is not None:
             logger.debug(f"📍 Found cached topic {topic_id} for server '{server_name}'")
             return topic_id
         return None
 
     def _get_or_create_topic_safe(self, server_name: str, chat_id=None):
         """Thread-safe method to get or create topic for server with duplicate prevention"""
+        server_name = sys.intern(server_name)
         chat_id = chat_id or config.TELEGRAM_CHAT_ID
         
         # Проверяем верификацию при запуске
-        if not self.startup_verification_done:
+        if not self._startup_done.is_set():
             self.startup_topic_verification(chat_id)
         
         # ВАЖНО: Сначала проверяем кэш БЕЗ блокировки для быстрого доступа
-        if server_name in self.server_topics:
-            cached_topic_id = self.server_topics[server_name]
+        # (один get: карта может быть заменена между "in" и индексированием)
+        cached_topic_id = self.server_topics.get(server_name)
+        if cached_topic_id is not None:
             
             # Быстрая проверка существования топика
             if self._topic_exists(chat_id, cached_topic_id):
@@ -205,78 +573,129 @@ class TelegramBotService:
             else:
                 logger.warning(f"⚠️ Cached topic {cached_topic_id} not found, will recreate")
         
-        # Используем блокировку только если нужно создать/пересоздать топик
-        with self.topic_creation_lock:
-            # Двойная проверка после получения блокировки
-            if server_name in self.server_topics:
-                topic_id = self.server_topics[server_name]
-                
-                # Повторная проверка существования с блокировкой
-                if self._topic_exists(chat_id, topic_id):
-                    logger.debug(f"✅ Using existing topic {topic_id} for server '{server_name}' (double-check)")
-                    return topic_id
-                else:
-                    logger.warning(f"🗑️ Topic {topic_id} confirmed missing, removing from cache")
-                    del self.server_topics[server_name]
-                    if topic_id in self.topic_name_cache:
-                        del self.topic_name_cache[topic_id]
-                    self._save_data()
-            
-            # Проверяем, поддерживает ли чат топики
-            if not self._check_if_supergroup_with_topics(chat_id):
-                logger.info(f"ℹ️ Chat doesn't support topics, using regular messages")
-                return None
+        # Создание/пересоздание: один поток на сервер делает запросы, остальные ждут его результат
+        with self._creations_lock:
+            event = self._pending_creations.get(server_name)
+            is_leader = event is None
+            if is_leader:
+                event = threading.Event()
+                self._pending_creations[server_name] = event
+        
+        if not is_leader:
+            event.wait(self.network_timeout)
+            return self.server_topics.get(server_name)
+        
+        try:
+            return self._create_topic(server_name, chat_id)
+        finally:
+            with self._creations_lock:
+                del self._pending_creations[server_name]
+            event.set()
+
+    def _create_topic(self, server_name: str, chat_id):
+        """Slow path of _get_or_create_topic_safe (only one caller per server at a time)"""
+        # Двойная проверка: топик мог появиться, пока мы ждали
+        topic_id = self.server_topics.get(server_name)
+        if topic_id is not None:
+            
+            # Повторная проверка существования (мы единственный создатель для сервера)
+            if self._topic_exists(chat_id, topic_id):
+                logger.debug(f"✅ Using existing topic {topic_id} for server '{server_name}' (double-check)")
+                return topic_id
+            else:
+                logger.warning(f"🗑️ Topic {topic_id} confirmed missing, removing from cache")
+                self._drop_topic(server_name)
+                self._save_data()
+        
+        # Проверяем, поддерживает ли чат топики
+        if not self._check_if_supergroup_with_topics(chat_id):
+            logger.info(f"ℹ️ Chat doesn't support topics, using regular messages")
+            return None
+        
+        # Проверяем, нет ли уже топика с таким именем (дополнительная защита) - O(1) по индексу
+        topic_name = f"{server_name}"
+        existing_topic_id = self.topic_by_name.get(topic_name)
+        if existing_topic_id is not None and self._topic_exists(chat_id, existing_topic_id):
+            existing_server = self.topic_name_cache.get(existing_topic_id)
+            logger.warning(f"🔍 Found existing topic with same name for different server: {existing_server}")
+            # Возвращаем существующий топик и обновляем маппинг
+            self._set_topic(server_name, existing_topic_id)
+            self._save_data()
+            return existing_topic_id
+        
+        # Создаём новый топик
+        logger.info(f"🔨 Creating new topic for server '{server_name}'")
+        
+        try:
+            topic = self.bot.create_forum_topic(
+                chat_id=chat_id,
+                name=topic_name,
+                icon_color=0x6FB9F0,  # Blue color
+                icon_custom_emoji_id=None
+            )
             
-            # Проверяем, нет ли уже топика с таким именем (дополнительная защита)
-            topic_name = f"{server_name}"
-            for existing_server, existing_topic_id in self.server_topics.items():
-                if existing_server != server_name and self._topic_exists(chat_id, existing_topic_id):
-                    try:
-                        topic_info = self.bot.get_forum_topic(chat_id, existing_topic_id)
-                        if topic_info and getattr(topic_info, 'name', '') == topic_name:
-                            logger.warning(f"🔍 Found existing topic with same name for different server: {existing_server}")
-                            # Возвращаем существующий топик и обновляем маппинг
-                            self.server_topics[server_name] = existing_topic_id
-                            self.topic_name_cache[existing_topic_id] = server_name
-                            self._save_data()
-                            return existing_topic_id
-                    except:
-                        continue
+            topic_id = topic.message_thread_id
+            self._set_topic(server_name, topic_id, title=topic_name)
+            self._topic_exists_cache[(chat_id, topic_id)] = (time.monotonic() + self._topic_exists_ttl, True)
+            self._save_data()
             
-            # Создаём новый топик
-            logger.info(f"🔨 Creating new topic for server '{server_name}'")
+            logger.success(f"✅ Created new topic for server '{server_name}' with ID: {topic_id}")
+            return topic_id
             
-            try:
-                topic = self.bot.create_forum_topic(
-                    chat_id=chat_id,
-                    name=topic_name,
-                    icon_color=0x6FB9F0,  # Blue color
-                    icon_custom_emoji_id=None
-                )
-                
-                topic_id = topic.message_thread_id
-                self.server_topics[server_name] = topic_id
-                self.topic_name_cache[topic_id] = server_name
-                self._save_data()
-                
-                logger.success(f"✅ Created new topic for server '{server_name}' with ID: {topic_id}")
-                return topic_id
-                
-            except Exception as e:
-                logger.error(f"❌ Error creating topic for server '{server_name}': {e}")
-                return None
+        except Exception as e:
+            logger.error(f"❌ Error creating topic for server '{server_name}': {e}")
+            return None
+
+    def _set_topic(self, server_name: str, topic_id: int, title: str = None):
+        """Map server -> topic by swapping in new dicts, so readers never see a half-updated map"""
+        with self._topics_write_lock:
+            topics = dict(self.server_topics)
+            names = dict(self.topic_name_cache)
+            old_topic_id = topics.get(server_name)
+            if old_topic_id is not None and names.get(old_topic_id) == server_name:
+                del names[old_topic_id]
+            topics[server_name] = topic_id
+            names[topic_id] = server_name
+            if title is not None:
+                by_name = dict(self.topic_by_name)
+                by_name[title] = topic_id
+                self.topic_by_name = by_name
+            self.server_topics = topics
+            self.topic_name_cache = names
+
+    def _drop_topic(self, server_name: str):
+        """Remove the server's topic mapping (copy-on-write); returns the old topic ID or None"""
+        return self._drop_topics((server_name,)).get(server_name)
+
+    def _drop_topics(self, server_names) -> Dict[str, int]:
+        """Remove several topic mappings with one copy of each map; returns server -> old topic ID"""
+        with self._topics_write_lock:
+            removed = {name: self.server_topics[name] for name in server_names if name in self.server_topics}
+            if not removed:
+                return removed
+            topics = dict(self.server_topics)
+            names = dict(self.topic_name_cache)
+            by_name = dict(self.topic_by_name)
+            for server_name, topic_id in removed.items():
+                del topics[server_name]
+                names.pop(topic_id, None)
+                if by_name.get(server_name) == topic_id:
+                    del by_name[server_name]
+            self.server_topics = topics
+            self.topic_name_cache = names
+            self.topic_by_name = by_name
+            return removed
 
     def _recreate_topic_if_missing(self, server_name: str, chat_id=None):
         """Recreate a topic if the current one is missing"""
         chat_id = chat_id or config.TELEGRAM_CHAT_ID
         
         # Remove the old topic ID from our mapping
-        if server_name in self.server_topics:
-            old_topic_id = self.server_topics[server_name]
-            logger.info(f"🗑️ Removing invalid topic {old_topic_id} for server '{server_name}'")
-            del self.server_topics[server_name]
-            if old_topic_id in self.topic_name_cache:
-                del self.topic_name_cache[old_topic_id]
+        old_topic_id = self._drop_topic(server_name)
+        if old_topic_id is not None:
+            # Telegram сообщил, что топика нет - кэшированное "существует" больше не верно
+            self._topic_exists_cache.pop((chat_id, old_topic_id), None)
+            logger.info(f"🗑️ Removed invalid topic {old_topic_id} for server '{server_name}'")
             self._save_data()
         
         # Create a new topic using safe method
@@ -284,19 +703,22 @@ class TelegramBotService:
 
     def format_message(self, message: Message) -> str:
         """Format message for topic replies"""
-        formatted = []
-        
-        # Add channel info if available
-        if message.channel_name:
-            formatted.append(f"📢 #{message.channel_name}")
-        
-        if config.TELEGRAM_UI_PREFERENCES['show_timestamps']:
-            formatted.append(f"📅 {message.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        formatted.append(f"👤 {message.author}")
-        formatted.append(f"💬 {message.content}")
+        # Шаблон выбирается по наличию канала; флаг show_timestamps прочитан в __init__
+        if self._show_timestamps:
+            template = _MESSAGE_TMPL_TS if message.channel_name else _MESSAGE_TMPL_TS_NO_CHANNEL
+            return template.format(
+                channel=message.channel_name,
+                ts=message.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                author=message.author,
+                content=message.content
+            )
         
-        return "\n".join(formatted)
+        template = _MESSAGE_TMPL if message.channel_name else _MESSAGE_TMPL_NO_CHANNEL
+        return template.format(
+            channel=message.channel_name,
+            author=message.author,
+            content=message.content
+        )
 
     def send_messages(self, messages: List[Message]):
         """Send formatted messages to Telegram with improved duplicate prevention"""
@@ -304,55 +726,79 @@ class TelegramBotService:
             return
         
         # Проверяем верификацию при запуске
-        if not self.startup_verification_done:
+        if not self._startup_done.is_set():
             self.startup_topic_verification()
         
-        server_groups = {}
+        server_groups = defaultdict(list)
         
         # Group messages by server
         for message in messages:
-            server_name = message.server_name or "Unknown Server"
-            if server_name not in server_groups:
-                server_groups[server_name] = []
-            server_groups[server_name].append(message)
+            server_groups[message.server_name or "Unknown Server"].append(message)
         
         # Send messages with server topics (NO DUPLICATES!)
-        for server_name, server_messages in server_groups.items():
-            logger.info(f"📤 Sending {len(server_messages)} messages for server: {server_name}")
-            
-            # ИСПРАВЛЕНИЕ: Используем быстрый метод для проверки существующих топиков
-            topic_id = self.get_server_topic_id(server_name)
-            if not topic_id:
-                # Создаём топик только если его нет (с защитой от дублей)
-                topic_id = self._get_or_create_topic_safe(server_name)
-            
-            # Sort messages chronologically (oldest first)
-            server_messages.sort(key=lambda x: x.timestamp, reverse=False)
-            
-            # Send messages in order
-            success_count = 0
-            for message in server_messages:
-                formatted = self.format_message(message)
-                sent_msg = self._send_message(
-                    formatted,
-                    message_thread_id=topic_id,
-                    server_name=server_name
-                )
-                
-                if sent_msg:
-                    # Store mapping between Discord and Telegram message IDs
-                    self.message_mappings[str(message.timestamp)] = sent_msg.message_id
-                    success_count += 1
-                else:
-                    logger.warning(f"❌ Failed to send message: {formatted[:50]}...")
-            
-            logger.info(f"✅ Sent {success_count}/{len(server_messages)} messages for {server_name}")
-            
-            # Save mappings after each server
-            self._save_data()
+        # Разные серверы - разные топики, отправляем их параллельно; внутри сервера порядок сохраняется
+        if len(server_groups) == 1:
+            self._send_server_group(*next(iter(server_groups.items())))
+        else:
+            list(self._send_pool.map(lambda item: self._send_server_group(*item), server_groups.items()))
             
         logger.success(f"✅ Completed sending messages for {len(server_groups)} servers")
 
+    def _send_server_group(self, server_name: str, server_messages: List[Message]):
+        """Send one server's messages to its topic, oldest first"""
+        logger.info(f"📤 Sending {len(server_messages)} messages for server: {server_name}")
+        
+        # ИСПРАВЛЕНИЕ: Используем быстрый метод для проверки существующих топиков
+        topic_id = self.get_server_topic_id(server_name)
+        if not topic_id:
+            # Создаём топик только если его нет (с защитой от дублей)
+            topic_id = self._get_or_create_topic_safe(server_name)
+        
+        # Sort messages chronologically (oldest first)
+        server_messages.sort(key=_BY_TIMESTAMP)
+        
+        # Send messages in order, packed into as few Telegram posts as possible
+        send = self._send_message
+        record = self.record_message_mapping
+        success_count = 0
+        for text, batch in self._batch_messages(server_messages):
+            sent_msg = send(
+                text,
+                message_thread_id=topic_id,
+                server_name=server_name
+            )
+            
+            if sent_msg:
+                # Store mapping between Discord and Telegram message IDs
+                for message in batch:
+                    record(str(message.timestamp), sent_msg.message_id)
+                success_count += len(batch)
+            else:
+                logger.warning(f"❌ Failed to send {len(batch)} message(s): {text[:50]}...")
+        
+        logger.info(f"✅ Sent {success_count}/{len(server_messages)} messages for {server_name}")
+        
+        # Save mappings after each server
+        self._save_data()
+
+    def _batch_messages(self, messages: List[Message]):
+        """Yield (text, messages) batches that fit into a single Telegram post"""
+        fmt = self.format_message
+        batch, parts, size = [], [], 0
+        for message in messages:
+            formatted = fmt(message)
+            added = len(formatted) + (len(_BATCH_SEPARATOR) if parts else 0)
+            if parts and size + added > _TG_TEXT_LIMIT:
+                yield _BATCH_SEPARATOR.join(parts), batch
+                batch, parts, size = [], [], 0
+                added = len(formatted)
+            batch.append(message)
+            parts.append(formatted)
+            size += added
+        
+        if parts:
+            yield _BATCH_SEPARATOR.join(parts), batch
+
     def _send_message(self, text: str, chat_id=None, message_thread_id=None, server_name=None):
         """Send message to topic or regular chat with error recovery and duplicate prevention"""
         chat_id = chat_id or config.TELEGRAM_CHAT_ID
@@ -363,16 +809,19 @@ class TelegramBotService:
         if message_thread_id:
             logger.debug(f"📍 Topic: {message_thread_id}")
             
-        for chunk in [text[i:i+4000] for i in range(0, len(text), 4000)]:
+        first_result = None
+        for chunk in _iter_chunks(text, _TG_TEXT_LIMIT):
             for attempt in range(max_retries):
                 try:
+                    self._pace_send(chat_id)
                     result = self.bot.send_message(
                         chat_id, 
                         chunk,
                         message_thread_id=message_thread_id
                     )
                     logger.debug(f"✅ Message sent successfully: {result.message_id}")
-                    return result
+                    first_result = first_result or result
+                    break
                     
                 except Exception as e:
                     error_str = str(e)
@@ -400,71 +849,95 @@ class TelegramBotService:
                         continue
                         
                     elif "Too Many Requests" in error_str:
-                        wait_time = 60  # Default wait time
-                        if "retry after" in error_str:
-                            try:
-                                wait_time = int(error_str.split("retry after")[1].strip())
-                            except:
-                                pass
+                        match = _RETRY_AFTER_RE.search(error_str)
+                        wait_time = int(match.group(1)) if match else 60  # Default wait time
                         logger.warning(f"⏳ Rate limited. Waiting {wait_time} seconds...")
                         time.sleep(wait_time)
                         continue
                         
                     elif attempt == max_retries - 1:
                         logger.error(f"💥 Failed to send message after {max_retries} attempts: {e}")
-                        return None
+                        return first_result
                         
                     time.sleep(retry_delay)
+            else:
+                # Все попытки для этой части исчерпаны
+                return first_result
             
-        return None
+        return first_result
+
+    def _pace_send(self, chat_id):
+        """Wait for a send slot in the global and per-chat token buckets"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets.setdefault(chat_id, TokenBucket(1, 1))
+        bucket.acquire()
+        self._global_bucket.acquire()
+
+    def _probe_topics_without_lock(self, chat_id):
+        """Проверить все топики без блокировки; возвращает (invalid, duplicates) как пары (server, topic_id)"""
+        invalid = []
+        duplicates = []
+        valid_topics = {}
+        
+        # server_topics заменяется целиком (copy-on-write), снимок читается без блокировки
+        topic_items = list(self.server_topics.items())
+        exists = self._topics_exist_bulk(chat_id, [tid for _, tid in topic_items], use_cache=False)
+        
+        for server_name, topic_id in topic_items:
+            if not exists[topic_id]:
+                invalid.append((server_name, topic_id))
+                continue
+            
+            # Проверяем на дубли
+            topic_name = f"{server_name}"
+            if topic_name in valid_topics:
+                old_topic_id = valid_topics[topic_name]
+                old_server = self.topic_name_cache.get(old_topic_id)
+                if old_server is not None:
+                    duplicates.append((old_server, old_topic_id))
+            
+            valid_topics[topic_name] = topic_id
+        
+        return invalid, duplicates
 
     def cleanup_invalid_topics(self, chat_id=None):
         """Clean up invalid topic mappings with duplicate detection"""
         chat_id = chat_id or config.TELEGRAM_CHAT_ID
         
+        # Все сетевые запросы выполняются вне topic_sync_lock
+        invalid, duplicates = self._probe_topics_without_lock(chat_id)
+        
+        for server_name, old_topic_id in duplicates:
+            logger.warning(f"🗑️ Duplicate topic found during cleanup: {server_name}")
+            try:
+                self.bot.close_forum_topic(chat_id, old_topic_id)
+            except:
+                pass
+        
+        stale = invalid + duplicates
+        if not stale:
+            return 0
+        
         with self.topic_sync_lock:
-            invalid_topics = []
-            valid_topics = {}
-            
-            for server_name, topic_id in list(self.server_topics.items()):
-                if not self._topic_exists(chat_id, topic_id):
-                    invalid_topics.append(server_name)
-                else:
-                    # Проверяем на дубли
-                    topic_name = f"{server_name}"
-                    if topic_name in valid_topics:
-                        # Найден дубль, закрываем старый
-                        old_topic_id = valid_topics[topic_name]
-                        logger.warning(f"🗑️ Duplicate topic found during cleanup: {server_name}")
-                        try:
-                            self.bot.close_forum_topic(chat_id, old_topic_id)
-                        except:
-                            pass
-                        # Удаляем старый из маппинга
-                        for srv, tid in list(self.server_topics.items()):
-                            if tid == old_topic_id:
-                                invalid_topics.append(srv)
-                                break
-                    
-                    valid_topics[topic_name] = topic_id
+            # Удаляем только те записи, которые не изменились во время проверки
+            current = self.server_topics
+            names = [server_name for server_name, topic_id in stale if current.get(server_name) == topic_id]
             
             # Remove invalid topics
-            for server_name in invalid_topics:
-                if server_name in self.server_topics:
-                    old_topic_id = self.server_topics[server_name]
-                    logger.info(f"🗑️ Removing invalid topic for server: {server_name} (ID: {old_topic_id})")
-                    del self.server_topics[server_name]
-                    if old_topic_id in self.topic_name_cache:
-                        del self.topic_name_cache[old_topic_id]
-            
-            if invalid_topics:
+            removed = self._drop_topics(names)
+            for server_name, old_topic_id in removed.items():
+                logger.info(f"🗑️ Removed invalid topic for server: {server_name} (ID: {old_topic_id})")
+            
+            if removed:
                 self._save_data()
-                logger.success(f"🧹 Cleaned up {len(invalid_topics)} invalid/duplicate topics")
+                logger.success(f"🧹 Cleaned up {len(removed)} invalid/duplicate topics")
             
-            return len(invalid_topics)
+            return len(removed)
 
     def add_channel_to_server(self, server_name: str, channel_id: str, channel_name: str = None):
         """Добавить новый канал к существующему серверу"""
+        server_name = sys.intern(server_name)
         try:
             # Проверяем, есть ли сервер в конфигурации
             if server_name not in config.SERVER_CHANNEL_MAPPINGS:
@@ -494,6 +967,7 @@ class TelegramBotService:
             # Добавляем канал в конфигурацию
             final_channel_name = channel_name or f"Channel_{channel_id}"
             config.SERVER_CHANNEL_MAPPINGS[server_name][channel_id] = final_channel_name
+            self._rebuild_server_index()
             
             # Добавляем канал в WebSocket подписки
             if self.websocket_service:
@@ -511,496 +985,309 @@ class TelegramBotService:
             logger.error(f"❌ Error adding channel to server: {e}")
             return False, f"Ошибка при добавлении канала: {str(e)}"
 
-    def start_bot(self):
-        """Start bot with improved topic management and startup verification"""
+    def _edit(self, text, chat_id, message_id, reply_markup=None, parse_mode=None, seq=None):
+        """edit_message_text that skips the API call when nothing changed or a newer render won"""
+        markup_json = reply_markup.to_json() if reply_markup else None
+        h = hash((text, markup_json, parse_mode))
+        key = (chat_id, message_id)
         
-        # Выполняем проверку топиков при запуске
-        self.startup_topic_verification()
+        if seq is None:
+            # Прямая правка новее любой отложенной версии этого сообщения - отложенную выбрасываем
+            seq = next(self._edit_seq)
+            with self._edit_queue_lock:
+                queued = self._edit_queue.get(key)
+                if queued is not None and queued[-1] < seq:
+                    del self._edit_queue[key]
         
-        @self.bot.message_handler(commands=['start', 'help'])
-        def send_welcome(message):
-            supports_topics = self._check_if_supergroup_with_topics(message.chat.id)
-            
-            text = (
-                "🤖 Welcome to Discord Announcement Parser!\n\n"
-                "🔥 **Real-time WebSocket Mode** - Instant message delivery!\n"
-                "📡 Messages are received via WebSocket for immediate forwarding\n"
-                "🛡️ **ANTI-DUPLICATE System**: Prevents topic duplication!\n\n"
-            )
-            
-            if supports_topics:
-                text += (
-                    "🔹 Forum Topics Mode (Enabled):\n"
-                    "• Each Discord server gets ONE topic (NO DUPLICATES)\n"
-                    "• Messages from all channels in server go to same topic\n"
-                    "• Smart caching prevents duplicate topic creation\n"
-                    "• Auto-recovery for missing topics\n"
-                    "• Fast topic lookup for real-time messages\n"
-                    "• Startup verification prevents duplicates on restart\n"
-                    "• Messages displayed chronologically\n\n"
-                )
-            else:
-                text += (
-                    "🔹 Regular Messages Mode:\n"
-                    "• Messages sent as regular chat messages\n"
-                    "• To enable topics, convert this chat to a supergroup with topics enabled\n\n"
-                )
-            
-            text += "Choose an action below:"
-            
-            markup = InlineKeyboardMarkup(row_width=2)
-            markup.add(
-                InlineKeyboardButton("📋 Server List", callback_data="servers"),
-                InlineKeyboardButton("🔄 Manual Sync", callback_data="refresh"),
-                InlineKeyboardButton("⚡ WebSocket Status", callback_data="websocket"),
-                InlineKeyboardButton("🧹 Clean Topics", callback_data="cleanup"),
-                InlineKeyboardButton("📊 Bot Status", callback_data="status"),
-                InlineKeyboardButton("ℹ️ Help", callback_data="help")
-            )
-            
-            self.bot.send_message(message.chat.id, text, reply_markup=markup)
-
-        # Обработчики callback queries должны быть определены ДО функций
-        def handle_servers_list(call):
-            """Показать список серверов с возможностью добавления каналов"""
-            if not hasattr(config, 'SERVER_CHANNEL_MAPPINGS') or not config.SERVER_CHANNEL_MAPPINGS:
-                markup = InlineKeyboardMarkup()
-                markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-                self.bot.edit_message_text(
-                    "❌ No servers found. Please configure servers first.",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=markup
-                )
+        with self._edit_stripes[hash(key) % len(self._edit_stripes)]:
+            with self._last_edit_lock:
+                last = self._last_edit.get(key)
+            if last is not None and last[1] > seq:
+                logger.debug(f"⏭️ Skipping stale edit of message {message_id}")
+                return
+            if last is not None and last[0] == h:
+                logger.debug(f"⏭️ Skipping unchanged edit of message {message_id}")
                 return
-                
-            markup = InlineKeyboardMarkup()
-            for server in config.SERVER_CHANNEL_MAPPINGS.keys():
-                # Add topic indicator with duplicate check
-                topic_indicator = ""
-                if server in self.server_topics:
-                    topic_id = self.server_topics[server]
-                    if self._topic_exists(call.message.chat.id, topic_id):
-                        topic_indicator = " 📋"
-                    else:
-                        topic_indicator = " ❌"
-                else:
-                    topic_indicator = " 🆕"  # New server, no topic yet
-                
-                markup.add(InlineKeyboardButton(
-                    f"{server}{topic_indicator}",
-                    callback_data=f"server_{server}"
-                ))
-            markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            
-            server_count = len(config.SERVER_CHANNEL_MAPPINGS)
-            topic_count = len(self.server_topics)
-            
-            text = (
-                f"📋 Select a server to view announcements:\n\n"
-                f"📊 {server_count} servers configured, {topic_count} topics created\n"
-                f"📋 = Has topic, ❌ = Invalid topic, 🆕 = New server\n"
-                f"🛡️ Anti-duplicate protection: {'✅ ACTIVE' if self.startup_verification_done else '⚠️ PENDING'}"
-            )
-            
-            self.bot.edit_message_text(
-                text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
-
-        def handle_manual_sync(call):
-            """Выполнить ручную синхронизацию"""
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
             
             try:
-                # Здесь можно добавить логику ручной синхронизации
-                # Например, вызов метода из discord_parser для обновления каналов
-                sync_result = "🔄 Manual sync completed successfully!"
-                if hasattr(self, 'discord_parser') and self.discord_parser:
-                    # Попробуем обновить список серверов
-                    sync_result += f"\n📊 Found {len(config.SERVER_CHANNEL_MAPPINGS)} servers"
-                
                 self.bot.edit_message_text(
-                    sync_result,
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=markup
+                    text,
+                    chat_id,
+                    message_id,
+                    reply_markup=reply_markup,
+                    parse_mode=parse_mode
                 )
             except Exception as e:
-                self.bot.edit_message_text(
-                    f"❌ Sync failed: {str(e)}",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=markup
-                )
+                # Telegram уже показывает этот текст - считаем правку успешной
+                if "message is not modified" not in str(e):
+                    raise
+            
+            with self._last_edit_lock:
+                self._last_edit[key] = (h, seq)
+                self._last_edit.move_to_end(key)
+                if len(self._last_edit) > self._last_edit_max:
+                    self._last_edit.popitem(last=False)
 
-        def handle_websocket_status(call):
-            """Показать статус WebSocket соединения"""
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            
-            ws_status = "❌ WebSocket service not available"
-            if self.websocket_service:
-                subscribed_channels = len(self.websocket_service.subscribed_channels)
-                http_channels = len(getattr(self.websocket_service, 'http_accessible_channels', set()))
-                ws_only_channels = len(getattr(self.websocket_service, 'websocket_accessible_channels', set()))
-                
-                ws_status = (
-                    f"⚡ WebSocket Status\n\n"
-                    f"📡 Subscribed channels: {subscribed_channels}\n"
-                    f"🌐 HTTP accessible: {http_channels}\n"
-                    f"🔌 WebSocket only: {ws_only_channels}\n"
-                    f"🔄 Status: {'✅ Active' if self.websocket_service.running else '❌ Inactive'}"
-                )
-            
-            self.bot.edit_message_text(
-                ws_status,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
-
-        def handle_cleanup_topics(call):
-            """Очистить недействительные топики"""
-            cleaned = self.cleanup_invalid_topics(call.message.chat.id)
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            self.bot.edit_message_text(
-                f"🧹 Topic cleanup completed!\n\n"
-                f"Removed {cleaned} invalid/duplicate topics.\n"
-                f"Current topics: {len(self.server_topics)}\n"
-                f"🛡️ Anti-duplicate protection: ACTIVE",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
+    def _queue_edit(self, text, chat_id, message_id, reply_markup=None, parse_mode=None, send_on_failure=False):
+        """Queue an edit; only the latest version per message is sent by the flusher"""
+        # Версия берётся в момент вызова: более поздняя прямая правка её перекроет
+        entry = (text, reply_markup, parse_mode, send_on_failure, next(self._edit_seq))
+        key = (chat_id, message_id)
+        with self._edit_queue_lock:
+            if key in self._edit_queue or len(self._edit_queue) < self._edit_queue_max:
+                self._edit_queue[key] = entry
+                return
+        
+        # Очередь переполнена - применяем правку сразу
+        logger.warning(f"⚠️ Edit queue is full ({self._edit_queue_max}), editing message {message_id} directly")
+        self._apply_edit(chat_id, message_id, *entry)
 
-        def handle_bot_status(call):
-            """Показать статус бота"""
-            supports_topics = self._check_if_supergroup_with_topics(call.message.chat.id)
-            
-            status_text = (
-                "📊 Bot Status\n\n"
-                f"🔹 Topics Support: {'✅ Enabled' if supports_topics else '❌ Disabled'}\n"
-                f"🔹 Active Topics: {len(self.server_topics)}\n"
-                f"🔹 Configured Servers: {len(config.SERVER_CHANNEL_MAPPINGS) if hasattr(config, 'SERVER_CHANNEL_MAPPINGS') else 0}\n"
-                f"🔹 Total Channels: {sum(len(channels) for channels in config.SERVER_CHANNEL_MAPPINGS.values()) if hasattr(config, 'SERVER_CHANNEL_MAPPINGS') else 0}\n"
-                f"🔹 Message Cache: {len(self.message_mappings)} messages\n"
-                f"🔹 WebSocket Channels: {len(self.websocket_service.subscribed_channels) if self.websocket_service else 0}\n"
-                f"🛡️ Anti-Duplicate Protection: {'✅ ACTIVE' if self.startup_verification_done else '⚠️ PENDING'}\n"
-                f"🔹 Topic Logic: One server = One topic ✅\n"
-                f"🔹 Startup Verification: {'✅ Complete' if self.startup_verification_done else '⏳ In Progress'}\n\n"
-                "📋 Current Topics:\n"
-            )
-            
-            if self.server_topics:
-                for server, topic_id in list(self.server_topics.items())[:10]:
-                    exists = self._topic_exists(call.message.chat.id, topic_id)
-                    status_icon = "✅" if exists else "❌"
-                    status_text += f"• {server}: Topic {topic_id} {status_icon}\n"
-                
-                if len(self.server_topics) > 10:
-                    status_text += f"• ... and {len(self.server_topics) - 10} more topics\n"
+    def _apply_edit(self, chat_id, message_id, text, reply_markup, parse_mode, send_on_failure, seq):
+        """Apply one queued edit, optionally falling back to a new message"""
+        try:
+            self._edit(text, chat_id, message_id, reply_markup=reply_markup, parse_mode=parse_mode, seq=seq)
+        except Exception as e:
+            if send_on_failure:
+                # Если не можем отредактировать, отправляем новое
+                self.bot.send_message(chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode)
             else:
-                status_text += "• No topics created yet\n"
-            
-            markup = InlineKeyboardMarkup()
-            markup.add(
-                InlineKeyboardButton("🧹 Clean Invalid", callback_data="cleanup"),
-                InlineKeyboardButton("🔄 Verify Topics", callback_data="verify"),
-                InlineKeyboardButton("🔙 Back to Menu", callback_data="start")
-            )
-            self.bot.edit_message_text(
-                status_text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
+                logger.warning(f"⚠️ Could not edit message {message_id}: {e}")
 
-        def handle_help(call):
-            """Показать справку"""
-            help_text = (
-                "ℹ️ **Discord Announcement Parser Help**\n\n"
-                "🤖 **Main Features:**\n"
-                "• Real-time Discord message monitoring\n"
-                "• Auto-forwarding to Telegram topics\n"
-                "• Anti-duplicate topic protection\n"
-                "• Manual channel management\n\n"
-                "📋 **Commands:**\n"
-                "• `/start` - Show main menu\n"
-                "• `/servers` - List all servers\n"
-                "• `/cleanup_topics` - Clean invalid topics\n"
-                "• `/verify_topics` - Verify topic integrity\n"
-                "• `/reset_topics` - Reset all topic mappings\n\n"
-                "🔧 **How to add channels:**\n"
-                "1. Go to Server List\n"
-                "2. Select a server\n"
-                "3. Click 'Add Channel'\n"
-                "4. Enter channel ID\n"
-                "5. Confirm addition\n\n"
-                "🛡️ **Topic Protection:**\n"
-                "• One server = One topic\n"
-                "• No duplicate topics\n"
-                "• Auto-recovery for missing topics\n"
-                "• Startup verification\n"
-            )
-            
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            
-            self.bot.edit_message_text(
-                help_text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
+    def _ack_callback(self, callback_id):
+        """Answer a callback query with no text (removes the client's loading spinner)"""
+        try:
+            self.bot.answer_callback_query(callback_id)
+        except Exception as e:
+            logger.debug(f"Could not answer callback {callback_id}: {e}")
 
-        def handle_verify_topics(call):
-            """Принудительная проверка топиков"""
-            self.startup_verification_done = False
-            self.startup_topic_verification(call.message.chat.id)
-            
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            self.bot.edit_message_text(
-                f"🔍 Topic verification completed!\n\n"
-                f"✅ Active topics: {len(self.server_topics)}\n"
-                f"🛡️ Duplicate protection: ACTIVE\n"
-                f"🔒 No duplicates found or removed",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
+    def _delete_message_quietly(self, chat_id, message_id):
+        """Delete a message, ignoring failures (already deleted, no rights, ...)"""
+        try:
+            self.bot.delete_message(chat_id, message_id)
+        except Exception as e:
+            logger.debug(f"Could not delete message {message_id}: {e}")
+
+    def _edit_flusher(self):
+        """Background loop that drains the edit queue every flush interval"""
+        while True:
+            time.sleep(self._edit_flush_interval)
+            with self._edit_queue_lock:
+                if not self._edit_queue:
+                    continue
+                pending, self._edit_queue = self._edit_queue, {}
+            
+            for (chat_id, message_id), entry in pending.items():
+                try:
+                    self._apply_edit(chat_id, message_id, *entry)
+                except Exception as e:
+                    logger.error(f"❌ Error flushing edit for message {message_id}: {e}")
+
+    def _resolve_channel_name(self, channel_id):
+        """Resolve a Discord channel name, caching hits (15 min) and misses (1 min)"""
+        now = time.monotonic()
+        cached = self._channel_info_cache.get(channel_id)
+        if cached and cached[0] > now:
+            info = cached[1]
+            return info['name'] if info else None
+        
+        # Первая сессия парсера - первый токен, прошедший проверку (сессии уже с keep-alive пулом)
+        discord_parser = getattr(self, 'discord_parser', None)
+        if not discord_parser or not discord_parser.sessions:
+            return None
+        
+        try:
+            r = discord_parser.sessions[0].get(
+                f'https://discord.com/api/v9/channels/{channel_id}',
+                timeout=5
             )
+        except Exception as e:
+            logger.debug(f"Could not get channel info: {e}")
+            return None
+        
+        if r.status_code == 200:
+            channel_info = r.json()
+            info = {'name': channel_info.get('name'), 'type': channel_info.get('type')}
+            ttl = self._channel_info_ttl
+        else:
+            info = None
+            ttl = self._channel_info_miss_ttl
+        
+        with self._channel_info_lock:
+            self._channel_info_cache.pop(channel_id, None)
+            self._channel_info_cache[channel_id] = (now + ttl, info)
+            if len(self._channel_info_cache) > self._channel_info_cache_max:
+                # Вытесняем самую старую запись
+                self._channel_info_cache.pop(next(iter(self._channel_info_cache)), None)
+        
+        return info['name'] if info else None
+
+    def _fetch_recent_messages(self, server_name, channel_id, channel_name, limit=10):
+        """Latest channel messages, reused for _recent_messages_ttl seconds (repeated clicks)"""
+        key = (channel_id, limit)
+        cached = self._recent_messages.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        messages = self.discord_parser.parse_announcement_channel(
+            channel_id,
+            server_name,
+            channel_name,
+            limit=limit
+        )
+        self._recent_messages[key] = (time.monotonic() + self._recent_messages_ttl, messages)
+        return messages
 
-        def handle_server_selected(call):
-            """Обработка выбора сервера"""
-            server_name = call.data.replace('server_', '', 1)
-            if not hasattr(config, 'SERVER_CHANNEL_MAPPINGS') or server_name not in config.SERVER_CHANNEL_MAPPINGS:
-                self.bot.answer_callback_query(call.id, "❌ Server not found")
-                return
-            
-            channels = config.SERVER_CHANNEL_MAPPINGS[server_name]
-            channel_count = len(channels)
+    def _fetch_and_send(self, server_name, channel_id, channel_name, callback_id):
+        """Fetch latest channel messages and forward them (runs in the callback pool)"""
+        try:
+            messages = self._fetch_recent_messages(server_name, channel_id, channel_name)
             
-            # Информация о топике
-            topic_info = ""
-            existing_topic_id = self.get_server_topic_id(server_name)
-            if existing_topic_id:
-                if self._topic_exists(call.message.chat.id, existing_topic_id):
-                    topic_info = f"📋 Topic: {existing_topic_id} ✅"
-                else:
-                    topic_info = f"📋 Topic: {existing_topic_id} ❌ (invalid)"
+            if messages:
+                # parse_announcement_channel уже возвращает сообщения по времени
+                self.send_messages(messages)
+                result_text = f"✅ Sent {len(messages)} messages from {server_name}"
             else:
-                topic_info = "📋 Topic: Not created yet"
+                result_text = "ℹ️ No messages found"
+                
+        except Exception as e:
+            logger.error(f"Error getting messages: {e}")
+            result_text = f"❌ Error: {str(e)}"
+        
+        try:
+            self.bot.answer_callback_query(callback_id, result_text)
+        except Exception as e:
+            logger.debug(f"Could not answer callback {callback_id}: {e}")
+
+    def _rebuild_server_index(self):
+        """Rebuild the server index from config.SERVER_CHANNEL_MAPPINGS"""
+        names, first_ids, first_names = [], [], []
+        for server_name, channels in config.SERVER_CHANNEL_MAPPINGS.items():
+            first = next(iter(channels.items()), (None, None))
+            names.append(sys.intern(server_name))
+            first_ids.append(first[0])
+            first_names.append(first[1])
+        
+        self._server_names = names
+        self._server_first_channel_id = first_ids
+        self._server_first_channel_name = first_names
+        self._server_name_to_idx = {name: idx for idx, name in enumerate(names)}
+
+    def _server_idx(self, server_name):
+        """Return the server's position in the server index, or None"""
+        idx = self._server_name_to_idx.get(server_name)
+        if idx is None:
+            self._rebuild_server_index()
+            idx = self._server_name_to_idx.get(server_name)
+        return idx
+
+    def _primary_channel(self, server_name):
+        """Return (channel_id, channel_name) of the server's first channel, or None"""
+        idx = self._server_name_to_idx.get(server_name)
+        if idx is None or idx >= len(self._server_first_channel_id) or self._server_first_channel_id[idx] is None:
+            # Конфигурация могла измениться (discovery, новые серверы) - перестраиваем индекс
+            self._rebuild_server_index()
+            idx = self._server_name_to_idx.get(server_name)
+            if idx is None or self._server_first_channel_id[idx] is None:
+                return None
+        return self._server_first_channel_id[idx], self._server_first_channel_name[idx]
+
+    def start_bot(self):
+        """Start bot with improved topic management and startup verification"""
+        
+        # Проверка топиков при запуске идёт в фоне, обработчики доступны сразу
+        # (отправка сообщений сама дождётся её через _startup_done)
+        threading.Thread(target=self.startup_topic_verification, daemon=True).start()
+        
+        # Фоновый поток для отложенных правок сообщений
+        threading.Thread(target=self._edit_flusher, daemon=True).start()
+        
+        @self.bot.message_handler(commands=['start', 'help'])
+        def send_welcome(message):
+            supports_topics = self._check_if_supergroup_with_topics(message.chat.id)
             
             text = (
-                f"**{server_name}**\n\n"
-                f"📊 Channels: {channel_count}\n"
-                f"{topic_info}\n\n"
-                f"📋 **Configured Channels:**\n"
+                "🤖 Welcome to Discord Announcement Parser!\n\n"
+                "🔥 **Real-time WebSocket Mode** - Instant message delivery!\n"
+                "📡 Messages are received via WebSocket for immediate forwarding\n"
+                "🛡️ **ANTI-DUPLICATE System**: Prevents topic duplication!\n\n"
             )
             
-            # Показываем каналы
-            if channels:
-                for channel_id, channel_name in list(channels.items())[:10]:
-                    text += f"• {channel_name} (`{channel_id}`)\n"
-                if len(channels) > 10:
-                    text += f"• ... and {len(channels) - 10} more channels\n"
-            else:
-                text += "• No channels configured\n"
-            
-            markup = InlineKeyboardMarkup()
-            
-            # Кнопки действий
-            if channels:
-                markup.add(
-                    InlineKeyboardButton("📥 Get Messages", callback_data=f"get_messages_{server_name}"),
-                    InlineKeyboardButton("➕ Add Channel", callback_data=f"add_channel_{server_name}")
+            if supports_topics:
+                text += (
+                    "🔹 Forum Topics Mode (Enabled):\n"
+                    "• Each Discord server gets ONE topic (NO DUPLICATES)\n"
+                    "• Messages from all channels in server go to same topic\n"
+                    "• Smart caching prevents duplicate topic creation\n"
+                    "• Auto-recovery for missing topics\n"
+                    "• Fast topic lookup for real-time messages\n"
+                    "• Startup verification prevents duplicates on restart\n"
+                    "• Messages displayed chronologically\n\n"
                 )
             else:
-                markup.add(
-                    InlineKeyboardButton("➕ Add Channel", callback_data=f"add_channel_{server_name}")
+                text += (
+                    "🔹 Regular Messages Mode:\n"
+                    "• Messages sent as regular chat messages\n"
+                    "• To enable topics, convert this chat to a supergroup with topics enabled\n\n"
                 )
             
-            markup.add(InlineKeyboardButton("🔙 Back to Servers", callback_data="servers"))
+            text += "Choose an action below:"
             
-            self.bot.edit_message_text(
-                text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup,
-                parse_mode='Markdown'
+            markup = InlineKeyboardMarkup(row_width=2)
+            markup.add(
+                InlineKeyboardButton("📋 Server List", callback_data="servers"),
+                InlineKeyboardButton("🔄 Manual Sync", callback_data="refresh"),
+                InlineKeyboardButton("⚡ WebSocket Status", callback_data="websocket"),
+                InlineKeyboardButton("🧹 Clean Topics", callback_data="cleanup"),
+                InlineKeyboardButton("📊 Bot Status", callback_data="status"),
+                InlineKeyboardButton("ℹ️ Help", callback_data="help")
             )
+            
+            self.bot.send_message(message.chat.id, text, reply_markup=markup)
 
-        def handle_get_messages(call):
+        # Обработчики callback queries должны быть определены ДО функций
+        def handle_get_messages(call, server_name):
             """Получить сообщения с сервера"""
-            server_name = call.data.replace('get_messages_', '', 1)
             channels = config.SERVER_CHANNEL_MAPPINGS.get(server_name, {})
             
             if not channels:
                 self.bot.answer_callback_query(call.id, "❌ No channels found for this server")
                 return
             
-            # Получаем первый канал для примера
-            channel_id, channel_name = next(iter(channels.items()))
+            # Основной канал сервера (первый добавленный) из индекса
+            pair = self._primary_channel(server_name)
+            if pair is None:
+                self.bot.answer_callback_query(call.id, "❌ No channels found for this server")
+                return
+            channel_id, channel_name = pair
             
             if hasattr(self, 'discord_parser') and self.discord_parser:
-                try:
-                    messages = self.discord_parser.parse_announcement_channel(
-                        channel_id,
-                        server_name,
-                        channel_name,
-                        limit=10
-                    )
-                    
-                    if messages:
-                        messages.sort(key=lambda x: x.timestamp)
-                        self.send_messages(messages)
-                        self.bot.answer_callback_query(
-                            call.id,
-                            f"✅ Sent {len(messages)} messages from {server_name}"
-                        )
-                    else:
-                        self.bot.answer_callback_query(call.id, "ℹ️ No messages found")
-                        
-                except Exception as e:
-                    logger.error(f"Error getting messages: {e}")
-                    self.bot.answer_callback_query(call.id, f"❌ Error: {str(e)}")
+                # Запрос к Discord может занять секунды - выполняем в пуле
+                self._cb_pool.submit(self._fetch_and_send, server_name, channel_id, channel_name, call.id)
             else:
                 self.bot.answer_callback_query(call.id, "❌ Discord parser not available")
 
-        def handle_add_channel_request(call):
-            """Запрос на добавление канала"""
-            server_name = call.data.replace('add_channel_', '', 1)
-            
-            # Сохраняем состояние пользователя
-            self.user_states[call.from_user.id] = {
-                'action': 'waiting_for_channel_id',
-                'server_name': server_name,
-                'chat_id': call.message.chat.id,
-                'message_id': call.message.message_id
-            }
-            
-            text = (
-                f"➕ **Adding Channel to {server_name}**\n\n"
-                f"🔹 Please send the Discord channel ID\n"
-                f"🔹 Example: `1234567890123456789`\n\n"
-                f"📝 **How to get channel ID:**\n"
-                f"1. Enable Developer Mode in Discord\n"
-                f"2. Right-click on the channel\n"
-                f"3. Click 'Copy ID'\n\n"
-                f"⚠️ Make sure the bot has access to this channel!"
-            )
-            
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_add_{server_name}"))
-            
-            self.bot.edit_message_text(
-                text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup,
-                parse_mode='Markdown'
-            )
-
-        def handle_confirm_add_channel(call):
-            """Подтверждение добавления канала"""
-            parts = call.data.replace('confirm_add_', '', 1).split('_', 1)
-            if len(parts) != 2:
-                self.bot.answer_callback_query(call.id, "❌ Invalid data")
-                return
-                
-            server_name, channel_id = parts
-            
-            # Получаем имя канала из состояния пользователя
-            user_state = self.user_states.get(call.from_user.id, {})
-            channel_name = user_state.get('channel_name', f"Channel_{channel_id}")
-            
-            # Добавляем канал
-            success, message = self.add_channel_to_server(server_name, channel_id, channel_name)
-            
-            markup = InlineKeyboardMarkup()
-            if success:
-                markup.add(
-                    InlineKeyboardButton("📋 View Server", callback_data=f"server_{server_name}"),
-                    InlineKeyboardButton("🔙 Back to Servers", callback_data="servers")
-                )
-                status_icon = "✅"
-            else:
-                markup.add(InlineKeyboardButton("🔙 Back to Server", callback_data=f"server_{server_name}"))
-                status_icon = "❌"
-            
-            self.bot.edit_message_text(
-                f"{status_icon} **Channel Addition Result**\n\n"
-                f"Server: {server_name}\n"
-                f"Channel ID: `{channel_id}`\n"
-                f"Channel Name: {channel_name}\n\n"
-                f"Result: {message}",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup,
-                parse_mode='Markdown'
-            )
-            
-            # Очищаем состояние пользователя
-            if call.from_user.id in self.user_states:
-                del self.user_states[call.from_user.id]
-
-        def handle_cancel_add_channel(call):
-            """Отмена добавления канала"""
-            server_name = call.data.replace('cancel_add_', '', 1)
-            
-            # Очищаем состояние пользователя
-            if call.from_user.id in self.user_states:
-                del self.user_states[call.from_user.id]
-            
-            # Возвращаемся к серверу
-            call.data = f"server_{server_name}"
-            handle_server_selected(call)
-
         @self.bot.callback_query_handler(func=lambda call: True)
         def handle_callback_query(call):
             """Универсальный обработчик всех callback запросов"""
+            # Отвечаем на callback сразу и не дожидаясь ответа API, чтобы убрать "loading"
+            self._ack_pool.submit(self._ack_callback, call.id)
             try:
                 data = call.data
                 logger.info(f"📞 Callback received: {data} from user {call.from_user.id}")
                 
-                # Отвечаем на callback сначала, чтобы убрать "loading"
-                self.bot.answer_callback_query(call.id)
-                
                 # Основные действия
-                if data == "servers":
-                    handle_servers_list(call)
-                elif data == "refresh":
-                    handle_manual_sync(call)
-                elif data == "websocket":
-                    handle_websocket_status(call)
-                elif data == "cleanup":
-                    handle_cleanup_topics(call)
-                elif data == "status":
-                    handle_bot_status(call)
-                elif data == "help":
-                    handle_help(call)
-                elif data == "start":
-                    send_welcome(call.message)
-                elif data == "verify":
-                    handle_verify_topics(call)
-                elif data.startswith("server_"):
-                    handle_server_selected(call)
-                elif data.startswith("get_messages_"):
-                    handle_get_messages(call)
-                elif data.startswith("add_channel_"):
-                    handle_add_channel_request(call)
-                elif data.startswith("confirm_add_"):
-                    handle_confirm_add_channel(call)
-                elif data.startswith("cancel_add_"):
-                    handle_cancel_add_channel(call)
-                else:
-                    logger.warning(f"⚠️ Unknown callback data: {data}")
-                    # Не отправляем answer_callback_query здесь, так как уже отправили выше
+                handler = action_handlers.get(data)
+                if handler is not None:
+                    handler(call)
+                    return
+                
+                # Префиксные действия: сужаем кандидатов по первым двум символам
+                for prefix, handler in prefix_by_head.get(data[:2], ()):
+                    if data.startswith(prefix):
+                        handler(call, sys.intern(data[len(prefix):]))
+                        return
+                logger.warning(f"⚠️ Unknown callback data: {data}")
+                # Не отправляем answer_callback_query здесь, так как уже отправили выше
                 
             except Exception as e:
                 logger.error(f"❌ Error handling callback query: {e}")
@@ -1010,26 +1297,30 @@ class TelegramBotService:
                 except:
                     pass
 
-        def handle_servers_list(call):
-            """Показать список серверов с возможностью добавления каналов"""
+        def render_servers(chat_id, message_id=None):
+            """Показать список серверов; без message_id отправляет новое сообщение"""
             if not hasattr(config, 'SERVER_CHANNEL_MAPPINGS') or not config.SERVER_CHANNEL_MAPPINGS:
                 markup = InlineKeyboardMarkup()
                 markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-                self.bot.edit_message_text(
-                    "❌ No servers found. Please configure servers first.",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=markup
-                )
+                text = "❌ No servers found. Please configure servers first."
+                if message_id is None:
+                    self.bot.send_message(chat_id, text, reply_markup=markup)
+                else:
+                    self._edit(text, chat_id, message_id, reply_markup=markup)
                 return
                 
+            topics = self.server_topics
+            exists = self._topics_exist_bulk(
+                chat_id, [topics[s] for s in config.SERVER_CHANNEL_MAPPINGS if s in topics]
+            )
+            
             markup = InlineKeyboardMarkup()
             for server in config.SERVER_CHANNEL_MAPPINGS.keys():
                 # Add topic indicator with duplicate check
                 topic_indicator = ""
-                if server in self.server_topics:
-                    topic_id = self.server_topics[server]
-                    if self._topic_exists(call.message.chat.id, topic_id):
+                if server in topics:
+                    topic_id = topics[server]
+                    if exists[topic_id]:
                         topic_indicator = " 📋"
                     else:
                         topic_indicator = " ❌"
@@ -1042,25 +1333,23 @@ class TelegramBotService:
                 ))
             markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
             
-            server_count = len(config.SERVER_CHANNEL_MAPPINGS)
-            topic_count = len(self.server_topics)
+            text = _SERVERS_LIST_TEMPLATE.format_map({
+                'server_count': len(config.SERVER_CHANNEL_MAPPINGS),
+                'topic_count': len(topics),
+                'protection': '✅ ACTIVE' if self.startup_verification_done else '⚠️ PENDING',
+            })
             
-            text = (
-                f"📋 Select a server to view announcements:\n\n"
-                f"📊 {server_count} servers configured, {topic_count} topics created\n"
-                f"📋 = Has topic, ❌ = Invalid topic, 🆕 = New server\n"
-                f"🛡️ Anti-duplicate protection: {'✅ ACTIVE' if self.startup_verification_done else '⚠️ PENDING'}"
-            )
-            
-            self.bot.edit_message_text(
-                text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
+            if message_id is None:
+                self.bot.send_message(chat_id, text, reply_markup=markup)
+            else:
+                self._edit(text, chat_id, message_id, reply_markup=markup)
 
         def handle_manual_sync(call):
             """Выполнить ручную синхронизацию"""
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
             markup = InlineKeyboardMarkup()
             markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
             
@@ -1072,22 +1361,26 @@ class TelegramBotService:
                     # Попробуем обновить список серверов
                     sync_result += f"\n📊 Found {len(config.SERVER_CHANNEL_MAPPINGS)} servers"
                 
-                self.bot.edit_message_text(
+                self._edit(
                     sync_result,
-                    call.message.chat.id,
-                    call.message.message_id,
+                    chat_id,
+                    message_id,
                     reply_markup=markup
                 )
             except Exception as e:
-                self.bot.edit_message_text(
+                self._edit(
                     f"❌ Sync failed: {str(e)}",
-                    call.message.chat.id,
-                    call.message.message_id,
+                    chat_id,
+                    message_id,
                     reply_markup=markup
                 )
 
         def handle_websocket_status(call):
             """Показать статус WebSocket соединения"""
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
             markup = InlineKeyboardMarkup()
             markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
             
@@ -1105,56 +1398,45 @@ class TelegramBotService:
                     f"🔄 Status: {'✅ Active' if self.websocket_service.running else '❌ Inactive'}"
                 )
             
-            self.bot.edit_message_text(
+            self._edit(
                 ws_status,
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup
             )
 
         def handle_cleanup_topics(call):
             """Очистить недействительные топики"""
-            cleaned = self.cleanup_invalid_topics(call.message.chat.id)
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
+            cleaned = self.cleanup_invalid_topics(chat_id)
             markup = InlineKeyboardMarkup()
             markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            self.bot.edit_message_text(
+            self._edit(
                 f"🧹 Topic cleanup completed!\n\n"
                 f"Removed {cleaned} invalid/duplicate topics.\n"
                 f"Current topics: {len(self.server_topics)}\n"
                 f"🛡️ Anti-duplicate protection: ACTIVE",
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup
             )
 
         def handle_bot_status(call):
             """Показать статус бота"""
-            supports_topics = self._check_if_supergroup_with_topics(call.message.chat.id)
-            
-            status_text = (
-                "📊 Bot Status\n\n"
-                f"🔹 Topics Support: {'✅ Enabled' if supports_topics else '❌ Disabled'}\n"
-                f"🔹 Active Topics: {len(self.server_topics)}\n"
-                f"🔹 Configured Servers: {len(config.SERVER_CHANNEL_MAPPINGS) if hasattr(config, 'SERVER_CHANNEL_MAPPINGS') else 0}\n"
-                f"🔹 Total Channels: {sum(len(channels) for channels in config.SERVER_CHANNEL_MAPPINGS.values()) if hasattr(config, 'SERVER_CHANNEL_MAPPINGS') else 0}\n"
-                f"🔹 Message Cache: {len(self.message_mappings)} messages\n"
-                f"🔹 WebSocket Channels: {len(self.websocket_service.subscribed_channels) if self.websocket_service else 0}\n"
-                f"🛡️ Anti-Duplicate Protection: {'✅ ACTIVE' if self.startup_verification_done else '⚠️ PENDING'}\n"
-                f"🔹 Topic Logic: One server = One topic ✅\n"
-                f"🔹 Startup Verification: {'✅ Complete' if self.startup_verification_done else '⏳ In Progress'}\n\n"
-                "📋 Current Topics:\n"
-            )
-            
-            if self.server_topics:
-                for server, topic_id in list(self.server_topics.items())[:10]:
-                    exists = self._topic_exists(call.message.chat.id, topic_id)
-                    status_icon = "✅" if exists else "❌"
-                    status_text += f"• {server}: Topic {topic_id} {status_icon}\n"
-                
-                if len(self.server_topics) > 10:
-                    status_text += f"• ... and {len(self.server_topics) - 10} more topics\n"
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
+            # Повторные клики в течение _status_ttl секунд используют готовый текст
+            cached = self._status_cache.get(chat_id)
+            if cached and cached[0] > time.monotonic():
+                status_text = cached[1]
             else:
-                status_text += "• No topics created yet\n"
+                status_text = render_status_text(chat_id)
+                self._status_cache[chat_id] = (time.monotonic() + self._status_ttl, status_text)
             
             markup = InlineKeyboardMarkup()
             markup.add(
@@ -1162,15 +1444,53 @@ class TelegramBotService:
                 InlineKeyboardButton("🔄 Verify Topics", callback_data="verify"),
                 InlineKeyboardButton("🔙 Back to Menu", callback_data="start")
             )
-            self.bot.edit_message_text(
+            self._edit(
                 status_text,
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup
             )
 
+        def render_status_text(chat_id):
+            """Собрать текст экрана статуса (с проверкой топиков)"""
+            supports_topics = self._check_if_supergroup_with_topics(chat_id)
+            
+            mappings = getattr(config, 'SERVER_CHANNEL_MAPPINGS', {})
+            verified = self.startup_verification_done
+            # Один снимок карты топиков на весь экран (карта заменяется целиком при записи)
+            topics = self.server_topics
+            vals = {
+                'topics_support': '✅ Enabled' if supports_topics else '❌ Disabled',
+                'active_topics': len(topics),
+                'configured_servers': len(mappings),
+                'total_channels': sum(len(channels) for channels in mappings.values()),
+                'message_cache': len(self.message_mappings),
+                'websocket_channels': len(self.websocket_service.subscribed_channels) if self.websocket_service else 0,
+                'protection': '✅ ACTIVE' if verified else '⚠️ PENDING',
+                'verification': '✅ Complete' if verified else '⏳ In Progress',
+            }
+            parts = [_STATUS_TEMPLATE.format_map(vals)]
+            
+            if topics:
+                shown = list(topics.items())[:10]
+                exists = self._topics_exist_bulk(chat_id, [tid for _, tid in shown])
+                for server, topic_id in shown:
+                    status_icon = "✅" if exists[topic_id] else "❌"
+                    parts.append(f"• {server}: Topic {topic_id} {status_icon}\n")
+                
+                if len(topics) > 10:
+                    parts.append(f"• ... and {len(topics) - 10} more topics\n")
+            else:
+                parts.append("• No topics created yet\n")
+            
+            return "".join(parts)
+
         def handle_help(call):
             """Показать справку"""
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
             help_text = (
                 "ℹ️ **Discord Announcement Parser Help**\n\n"
                 "🤖 **Main Features:**\n"
@@ -1200,33 +1520,41 @@ class TelegramBotService:
             markup = InlineKeyboardMarkup()
             markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
             
-            self.bot.edit_message_text(
+            self._edit(
                 help_text,
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup
             )
 
         def handle_verify_topics(call):
             """Принудительная проверка топиков"""
-            self.startup_verification_done = False
-            self.startup_topic_verification(call.message.chat.id)
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
+            self._startup_done.clear()
+            self._forum_chats.pop(chat_id, None)
+            self.startup_topic_verification(chat_id)
             
             markup = InlineKeyboardMarkup()
             markup.add(InlineKeyboardButton("🔙 Back to Menu", callback_data="start"))
-            self.bot.edit_message_text(
+            self._edit(
                 f"🔍 Topic verification completed!\n\n"
                 f"✅ Active topics: {len(self.server_topics)}\n"
                 f"🛡️ Duplicate protection: ACTIVE\n"
                 f"🔒 No duplicates found or removed",
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup
             )
 
-        def handle_server_selected(call):
-            """Обработка выбора сервера"""
-            server_name = call.data.replace('server_', '', 1)
+        def render_server_view(call, server_name):
+            """Отрисовать карточку сервера (без разбора call.data)"""
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            
             if not hasattr(config, 'SERVER_CHANNEL_MAPPINGS') or server_name not in config.SERVER_CHANNEL_MAPPINGS:
                 self.bot.answer_callback_query(call.id, "❌ Server not found")
                 return
@@ -1238,7 +1566,7 @@ class TelegramBotService:
             topic_info = ""
             existing_topic_id = self.get_server_topic_id(server_name)
             if existing_topic_id:
-                if self._topic_exists(call.message.chat.id, existing_topic_id):
+                if self._topic_exists(chat_id, existing_topic_id):
                     topic_info = f"📋 Topic: {existing_topic_id} ✅"
                 else:
                     topic_info = f"📋 Topic: {existing_topic_id} ❌ (invalid)"
@@ -1252,10 +1580,12 @@ class TelegramBotService:
                 f"📋 **Configured Channels:**\n"
             )
             
-            # Показываем каналы
+            # Показываем каналы (islice: без копии всего словаря ради первых 10)
             if channels:
-                for channel_id, channel_name in list(channels.items())[:10]:
-                    text += f"• {channel_name} (`{channel_id}`)\n"
+                text += "".join(
+                    f"• {channel_name} (`{channel_id}`)\n"
+                    for channel_id, channel_name in itertools.islice(channels.items(), 10)
+                )
                 if len(channels) > 10:
                     text += f"• ... and {len(channels) - 10} more channels\n"
             else:
@@ -1266,7 +1596,7 @@ class TelegramBotService:
             # Кнопки действий
             if channels:
                 markup.add(
-                    InlineKeyboardButton("📥 Get Messages", callback_data=f"server_{server_name}"),
+                    InlineKeyboardButton("📥 Get Messages", callback_data=f"get_messages_{server_name}"),
                     InlineKeyboardButton("➕ Add Channel", callback_data=f"add_channel_{server_name}")
                 )
             else:
@@ -1276,10 +1606,10 @@ class TelegramBotService:
             
             markup.add(InlineKeyboardButton("🔙 Back to Servers", callback_data="servers"))
             
-            self.bot.edit_message_text(
+            self._edit(
                 text,
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup,
                 parse_mode='Markdown'
             )
@@ -1288,52 +1618,55 @@ class TelegramBotService:
             if server_name in getattr(self, '_temp_server_action', {}):
                 perform_get_messages(call, server_name)
 
-        def handle_add_channel_request(call):
+        def handle_add_channel_request(call, server_name):
             """Запрос на добавление канала"""
-            server_name = call.data.replace('add_channel_', '', 1)
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
             
             # Сохраняем состояние пользователя
-            self.user_states[call.from_user.id] = {
-                'action': 'waiting_for_channel_id',
-                'server_name': server_name,
-                'chat_id': call.message.chat.id,
-                'message_id': call.message.message_id
-            }
-            
-            text = (
-                f"➕ **Adding Channel to {server_name}**\n\n"
-                f"🔹 Please send the Discord channel ID\n"
-                f"🔹 Example: `1234567890123456789`\n\n"
-                f"📝 **How to get channel ID:**\n"
-                f"1. Enable Developer Mode in Discord\n"
-                f"2. Right-click on the channel\n"
-                f"3. Click 'Copy ID'\n\n"
-                f"⚠️ Make sure the bot has access to this channel!"
+            self.user_states[call.from_user.id] = PendingAddChannel(
+                server_name=server_name,
+                chat_id=chat_id,
+                message_id=message_id
             )
             
-            markup = InlineKeyboardMarkup()
-            markup.add(InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_add_{server_name}"))
+            text = _ADD_CHANNEL_INSTRUCTIONS_TMPL.format(server_name=server_name)
+            markup = _build_cancel_markup(server_name)
             
-            self.bot.edit_message_text(
+            self._queue_edit(
                 text,
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup,
                 parse_mode='Markdown'
             )
 
-        def handle_confirm_add_channel(call):
+        def handle_confirm_add_channel(call, payload):
             """Подтверждение добавления канала"""
-            parts = call.data.replace('confirm_add_', '', 1).split('_', 1)
-            if len(parts) != 2:
+            msg = call.message
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            user_id = call.from_user.id
+            
+            decoded = _decode_confirm_token(payload)
+            if decoded is None or decoded[0] >= len(self._server_names):
                 self.bot.answer_callback_query(call.id, "❌ Invalid data")
                 return
-                
-            server_name, channel_id = parts
+            
+            server_idx, channel_id = decoded
+            server_name = self._server_names[server_idx]
+            
+            # Индекс сервера меняется при перестройке индекса (новая конфигурация) -
+            # сверяем с сервером, к которому пользователь добавлял канал
+            user_state = self.user_states.get(user_id)
+            if user_state is None or user_state.server_name != server_name:
+                self.user_states.pop(user_id, None)
+                self.bot.answer_callback_query(call.id, "❌ Server list changed, please add the channel again")
+                return
             
             # Получаем имя канала из состояния пользователя
-            user_state = self.user_states.get(call.from_user.id, {})
-            channel_name = user_state.get('channel_name', f"Channel_{channel_id}")
+            channel_name = getattr(user_state, 'channel_name', None) or f"Channel_{channel_id}"
             
             # Добавляем канал
             success, message = self.add_channel_to_server(server_name, channel_id, channel_name)
@@ -1349,33 +1682,30 @@ class TelegramBotService:
                 markup.add(InlineKeyboardButton("🔙 Back to Server", callback_data=f"server_{server_name}"))
                 status_icon = "❌"
             
-            self.bot.edit_message_text(
+            self._queue_edit(
                 f"{status_icon} **Channel Addition Result**\n\n"
                 f"Server: {server_name}\n"
                 f"Channel ID: `{channel_id}`\n"
                 f"Channel Name: {channel_name}\n\n"
                 f"Result: {message}",
-                call.message.chat.id,
-                call.message.message_id,
+                chat_id,
+                message_id,
                 reply_markup=markup,
                 parse_mode='Markdown'
             )
             
             # Очищаем состояние пользователя
-            if call.from_user.id in self.user_states:
-                del self.user_states[call.from_user.id]
+            self.user_states.pop(user_id, None)
 
-        def handle_cancel_add_channel(call):
+        def handle_cancel_add_channel(call, server_name):
             """Отмена добавления канала"""
-            server_name = call.data.replace('cancel_add_', '', 1)
             
             # Очищаем состояние пользователя
             if call.from_user.id in self.user_states:
                 del self.user_states[call.from_user.id]
             
             # Возвращаемся к серверу
-            call.data = f"server_{server_name}"
-            handle_server_selected(call)
+            render_server_view(call, server_name)
 
         def perform_get_messages(call, server_name):
             """Получить и отправить сообщения с сервера"""
@@ -1384,20 +1714,15 @@ class TelegramBotService:
                 self.bot.answer_callback_query(call.id, "❌ No channels found for this server")
                 return
             
-            # Получаем первый канал для примера
-            channel_id, channel_name = next(iter(channels.items()))
+            # Получаем первый канал из индекса серверов
+            channel_id, channel_name = self._primary_channel(server_name)
             
             if hasattr(self, 'discord_parser') and self.discord_parser:
                 try:
-                    messages = self.discord_parser.parse_announcement_channel(
-                        channel_id,
-                        server_name,
-                        channel_name,
-                        limit=10
-                    )
+                    messages = self._fetch_recent_messages(server_name, channel_id, channel_name)
                     
                     if messages:
-                        messages.sort(key=lambda x: x.timestamp)
+                        # Уже отсортированы по времени в parse_announcement_channel
                         self.send_messages(messages)
                         self.bot.answer_callback_query(
                             call.id,
@@ -1412,112 +1737,52 @@ class TelegramBotService:
             else:
                 self.bot.answer_callback_query(call.id, "❌ Discord parser not available")
 
-        @self.bot.message_handler(func=lambda message: True)
-        def handle_text_message(message):
-            """Обработка текстовых сообщений (для добавления каналов)"""
-            user_id = message.from_user.id
-            
-            # Проверяем, ждем ли мы от пользователя channel ID
-            if user_id in self.user_states:
-                user_state = self.user_states[user_id]
-                
-                if user_state.get('action') == 'waiting_for_channel_id':
-                    channel_id = message.text.strip()
-                    server_name = user_state['server_name']
-                    original_chat_id = user_state['chat_id']
-                    original_message_id = user_state['message_id']
-                    
-                    # Валидация channel ID
-                    if not channel_id.isdigit() or len(channel_id) < 17:
-                        self.bot.reply_to(
-                            message, 
-                            "❌ Invalid channel ID format. Please send a valid Discord channel ID (17-19 digits)"
-                        )
-                        return
-                    
-                    # Пытаемся получить имя канала
-                    channel_name = f"Channel_{channel_id}"
-                    if hasattr(self, 'discord_parser') and self.discord_parser:
-                        try:
-                            # Пробуем получить информацию о канале
-                            session = self.discord_parser.sessions[0] if self.discord_parser.sessions else None
-                            if session:
-                                r = session.get(f'https://discord.com/api/v9/channels/{channel_id}')
-                                if r.status_code == 200:
-                                    channel_info = r.json()
-                                    channel_name = channel_info.get('name', channel_name)
-                        except Exception as e:
-                            logger.debug(f"Could not get channel info: {e}")
-                    
-                    # Сохраняем имя канала в состоянии
-                    self.user_states[user_id]['channel_name'] = channel_name
-                    
-                    # Показываем подтверждение
-                    confirmation_text = (
-                        f"🔍 **Channel Information**\n\n"
-                        f"Server: {server_name}\n"
-                        f"Channel ID: `{channel_id}`\n"
-                        f"Channel Name: {channel_name}\n\n"
-                        f"➕ Add this channel to monitoring?"
-                    )
-                    
-                    markup = InlineKeyboardMarkup()
-                    markup.add(
-                        InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_add_{server_name}_{channel_id}"),
-                        InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_add_{server_name}")
-                    )
-                    
-                    # Удаляем сообщение пользователя
-                    try:
-                        self.bot.delete_message(message.chat.id, message.message_id)
-                    except:
-                        pass
-                    
-                    # Обновляем оригинальное сообщение
-                    try:
-                        self.bot.edit_message_text(
-                            confirmation_text,
-                            original_chat_id,
-                            original_message_id,
-                            reply_markup=markup,
-                            parse_mode='Markdown'
-                        )
-                    except Exception as e:
-                        # Если не можем отредактировать, отправляем новое
-                        self.bot.send_message(
-                            message.chat.id,
-                            confirmation_text,
-                            reply_markup=markup,
-                            parse_mode='Markdown'
-                        )
+        # Точные callback'и: handler(call)
+        action_handlers = {
+            "servers": lambda call: render_servers(call.message.chat.id, call.message.message_id),
+            "refresh": handle_manual_sync,
+            "websocket": handle_websocket_status,
+            "cleanup": handle_cleanup_topics,
+            "status": handle_bot_status,
+            "help": handle_help,
+            "start": lambda call: send_welcome(call.message),
+            "verify": handle_verify_topics,
+        }
+
+        # Префиксные callback'и: handler(call, payload), payload = data без префикса
+        prefix_by_head = defaultdict(list)
+        for prefix, handler in (
+            ("server_", render_server_view),
+            ("get_messages_", handle_get_messages),
+            ("add_channel_", handle_add_channel_request),
+            ("confirm_add_", handle_confirm_add_channel),
+            ("cancel_add_", handle_cancel_add_channel),
+        ):
+            prefix_by_head[prefix[:2]].append((prefix, handler))
 
         # Команды для управления топиками
         @self.bot.message_handler(commands=['servers'])
         def list_servers_command(message):
             """Команда для отображения списка серверов"""
-            # Создаем фиктивный callback для переиспользования логики
-            class FakeCall:
-                def __init__(self, message):
-                    self.message = message
-                    self.data = "servers"
-            
-            fake_call = FakeCall(message)
-            handle_servers_list(fake_call)
+            render_servers(message.chat.id)
 
         @self.bot.message_handler(commands=['reset_topics'])
         def reset_topics(message):
             """Reset all topic mappings with confirmation"""
-            with self.topic_creation_lock:
-                backup_topics = self.server_topics.copy()
-                self.server_topics.clear()
-                self.topic_name_cache.clear()
-                self.startup_verification_done = False
-                self._save_data()
-                
+            self._rebuild_server_index()
+            # Под блокировкой только подменяем словари, старые не трогаем
+            with self._topics_write_lock:
+                cleared_count = len(self.server_topics)
+                self.server_topics = {}
+                self.topic_name_cache = {}
+                self.topic_by_name = {}
+                self._startup_done.clear()
+            self._save_data()
+            
             self.bot.reply_to(
                 message, 
                 f"✅ All topic mappings have been reset.\n"
-                f"🗑️ Cleared {len(backup_topics)} topic mappings.\n"
+                f"🗑️ Cleared {cleared_count} topic mappings.\n"
                 f"🆕 New topics will be created when needed.\n"
                 f"🛡️ Anti-duplicate protection will be active."
             )
@@ -1525,7 +1790,8 @@ class TelegramBotService:
         @self.bot.message_handler(commands=['verify_topics'])
         def verify_topics_command(message):
             """Force topic verification to check for duplicates"""
-            self.startup_verification_done = False
+            self._startup_done.clear()
+            self._forum_chats.pop(message.chat.id, None)
             old_count = len(self.server_topics)
             
             self.startup_topic_verification(message.chat.id)
@@ -1554,6 +1820,68 @@ class TelegramBotService:
                 f"🛡️ Anti-duplicate protection: ✅ ACTIVE"
             )
 
+        # Ввод channel ID регистрируется после команд и видит только числовой текст,
+        # остальные сообщения telebot отбрасывает без вызова обработчика
+        @self.bot.message_handler(content_types=['text'], regexp=_CHANNEL_ID_INPUT_RE.pattern)
+        def handle_text_message(message):
+            """Обработка текстовых сообщений (для добавления каналов)"""
+            # Быстрый выход: пользователь не в процессе добавления канала
+            user_state = self.user_states.get(message.from_user.id)
+            if user_state is None:
+                return
+            
+            channel_id = message.text.strip()
+            server_name = user_state.server_name
+            original_chat_id = user_state.chat_id
+            original_message_id = user_state.message_id
+            
+            # Валидация channel ID
+            if not _SNOWFLAKE_RE.match(channel_id):
+                self.bot.reply_to(
+                    message, 
+                    "❌ Invalid channel ID format. Please send a valid Discord channel ID (17-20 digits)"
+                )
+                return
+            
+            # 20 цифр могут не поместиться в 64 бита токена подтверждения
+            if int(channel_id) > _CB_MAX_CHANNEL_ID:
+                self.bot.reply_to(message, "❌ Invalid channel ID")
+                return
+            
+            # Сервер мог пропасть из конфигурации, пока пользователь вводил ID
+            server_idx = self._server_idx(server_name)
+            if server_idx is None or server_idx > _CB_MAX_SERVER_IDX:
+                self.user_states.pop(message.from_user.id, None)
+                self.bot.reply_to(message, "❌ Server not found")
+                return
+            
+            # Удаляем сообщение пользователя в пуле, параллельно с запросом имени канала
+            self._cb_pool.submit(self._delete_message_quietly, message.chat.id, message.message_id)
+            
+            # Пытаемся получить имя канала (с кэшем)
+            channel_name = self._resolve_channel_name(channel_id) or f"Channel_{channel_id}"
+            
+            # Сохраняем имя канала в состоянии
+            user_state.channel_name = channel_name
+            
+            # Показываем подтверждение
+            confirmation_text = _CHANNEL_CONFIRM_TMPL.format(
+                server_name=server_name,
+                channel_id=channel_id,
+                channel_name=channel_name
+            )
+            markup = _build_confirm_markup(server_name, server_idx, channel_id)
+            
+            # Обновляем оригинальное сообщение (или отправляем новое, если не получится)
+            self._queue_edit(
+                confirmation_text,
+                original_chat_id,
+                original_message_id,
+                reply_markup=markup,
+                parse_mode='Markdown',
+                send_on_failure=True
+            )
+
         logger.success("🤖 Telegram Bot started with ENHANCED ANTI-DUPLICATE topic management:")
         logger.info("   ✅ One server = One topic (GUARANTEED)")
         logger.info("   🛡️ Startup verification prevents duplicates")
@@ -1,86 +1,94 @@
 import requests
-import json
+import orjson
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+# Суффиксы имён announcement-каналов (одна проверка endswith на канал)
+_ANNOUNCEMENT_SUFFIXES = ('announcement', 'announcements')
+
+
+def is_announcement_channel(channel):
+    """Whether a Discord channel payload is an announcement channel (by name)"""
+    return channel['name'].lower().endswith(_ANNOUNCEMENT_SUFFIXES)
+
+
+def first_announcement_channel(channels):
+    """First announcement channel in the list, or None"""
+    return next((channel for channel in channels if is_announcement_channel(channel)), None)
+
 class DiscordIDCollector:
     def __init__(self, token):
         self.token = token
         self.session = requests.Session()
         self.session.headers = {'Authorization': self.token}
+        # Пул keep-alive соединений для потоков collect_ids
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=Retry(total=0)))
         self.servers_data = {}
+        self.max_workers = 16
         
+        # Общий для всех потоков момент, до которого Discord просит подождать (429)
+        self._rate_lock = threading.Lock()
+        self._next_allowed_time = 0.0
 
-    def get_guilds(self):
-        """Get list of guilds/servers the user is in with pagination"""
-        guilds = []
-        url = 'https://discord.com/api/v9/users/@me/guilds'
-        
+    def _wait_for_rate_limit(self):
+        """Sleep until the shared rate limit window has passed"""
+        with self._rate_lock:
+            delay = self._next_allowed_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _set_rate_limit(self, retry_after):
+        """Push back the shared rate limit window for every worker"""
+        with self._rate_lock:
+            self._next_allowed_time = max(self._next_allowed_time, time.monotonic() + retry_after)
+
+    @staticmethod
+    def _next_link(link_header):
+        """Extract the rel="next" URL from a Link header (None if there is no next page)"""
+        if not link_header:
+            return None
+        for link in link_header.split(','):
+            if 'rel="next"' in link:
+                return link[link.find('<')+1:link.find('>')]
+        return None
+
+    def _paged_get(self, url, what):
+        """Yield decoded pages of a paginated endpoint, waiting out rate limits"""
         while url:
             try:
+                self._wait_for_rate_limit()
                 r = self.session.get(url)
-                if r.status_code == 200:
-                    guilds.extend(json.loads(r.text))
-                    # Check for pagination
-                    if 'Link' in r.headers:
-                        links = r.headers['Link'].split(',')
-                        for link in links:
-                            if 'rel="next"' in link:
-                                url = link[link.find('<')+1:link.find('>')]
-                                break
-                            else:
-                                url = None
-                    else:
-                        url = None
-                elif r.status_code == 429:  # Rate limited
-                    retry_after = float(r.json().get('retry_after', 1))
+                if r.status_code == 429:  # Rate limited
+                    # Тело разбираем, только если нет заголовка Retry-After
+                    retry_after = float(r.headers.get('Retry-After') or r.json().get('retry_after', 1))
                     print(f"Rate limited, waiting {retry_after} seconds...")
-                    time.sleep(retry_after)
+                    self._set_rate_limit(retry_after)
                     continue
-                else:
-                    print(f"Warning: Failed to get guilds (status {r.status_code})")
-                    url = None
+                if r.status_code != 200:
+                    print(f"Warning: Failed to get {what} (status {r.status_code})")
+                    return
+                page = orjson.loads(r.content)
+                url = self._next_link(r.headers.get('Link'))
             except Exception as e:
-                print(f"Error getting guilds: {str(e)}")
-                url = None
-                
-        return guilds
+                print(f"Error getting {what}: {str(e)}")
+                return
+            
+            yield page
+
+    def get_guilds(self):
+        """Get list of guilds/servers the user is in with pagination"""
+        url = 'https://discord.com/api/v9/users/@me/guilds'
+        return [guild for page in self._paged_get(url, 'guilds') for guild in page]
 
     def get_guild_channels(self, guild_id):
         """Get channels for a specific guild with pagination and rate limit handling"""
-        channels = []
         url = f'https://discord.com/api/v9/guilds/{guild_id}/channels'
-        
-        while url:
-            try:
-                r = self.session.get(url)
-                if r.status_code == 200:
-                    channels.extend(json.loads(r.text))
-                    # Check for pagination
-                    if 'Link' in r.headers:
-                        links = r.headers['Link'].split(',')
-                        for link in links:
-                            if 'rel="next"' in link:
-                                url = link[link.find('<')+1:link.find('>')]
-                                break
-                            else:
-                                url = None
-                    else:
-                        url = None
-                elif r.status_code == 429:  # Rate limited
-                    retry_after = float(r.json().get('retry_after', 1))
-                    print(f"Rate limited, waiting {retry_after} seconds...")
-                    time.sleep(retry_after)
-                    continue
-                else:
-                    print(f"Warning: Failed to get channels for guild {guild_id} (status {r.status_code})")
-                    url = None
-            except Exception as e:
-                print(f"Error getting channels for guild {guild_id}: {str(e)}")
-                url = None
-                
-        return channels
+        return [channel for page in self._paged_get(url, f'channels for guild {guild_id}') for channel in page]
 
     def collect_ids(self, server_id=None):
         """Main collection method using HTTP API
@@ -89,25 +97,23 @@ class DiscordIDCollector:
         Returns: dict of guild data with announcement channels"""
         try:
             guilds = self.get_guilds()
-            for guild in guilds:
-                if server_id and guild['id'] != server_id:
-                    continue
-                    
+            if server_id:
+                guilds = [guild for guild in guilds if guild['id'] == server_id]
+            
+            # Каналы серверов запрашиваем параллельно; map сохраняет порядок серверов
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                channel_lists = list(pool.map(self.get_guild_channels, [guild['id'] for guild in guilds]))
+            
+            for guild, channels in zip(guilds, channel_lists):
                 guild_data = {
                     'guild_id': guild['id'],
                     'guild_name': guild['name'],
                     'announcement_channels': {}
                 }
 
-                channels = self.get_guild_channels(guild['id'])
                 # Find first channel with name ending in "announcement" or "announcements"
-                announcement_channels = []
-                for ch in channels:
-                    lower_name = ch['name'].lower()
-                    if (lower_name.endswith('announcement') or 
-                        lower_name.endswith('announcements')):
-                        announcement_channels.append(ch)
-                        break  # Only keep first match
+                first = first_announcement_channel(channels)
+                announcement_channels = [first] if first else []
                 
                 for channel in announcement_channels:
                     guild_data['announcement_channels'][channel['name']] = {
@@ -122,8 +128,10 @@ class DiscordIDCollector:
                     print(f"  - {channel['name']} (ID: {channel['id']}, Type: {channel.get('type')})")
 
             # Save data to JSON file
-            with open('discord_announcement_channels.json', 'w', encoding='utf-8') as f:
-                json.dump(self.servers_data, f, indent=2, ensure_ascii=False)
+            with open('discord_announcement_channels.json', 'wb') as f:
+                f.write(orjson.dumps(self.servers_data, option=orjson.OPT_INDENT_2))
+                f.flush()
+                os.fsync(f.fileno())
             
             print("\nData saved to discord_channels.json")
             return self.servers_data
@@ -0,0 +1,29 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket: at most `rate` acquisitions per `per` seconds (bursts up to `rate`)"""
+
+    def __init__(self, rate: float, per: float = 1.0):
+        self.capacity = rate
+        self.fill_rate = rate / per
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                # Сколько ждать до следующего токена
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
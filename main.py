@@ -1,6 +1,7 @@
 import requests
 import json
 import os
+from dataclasses import asdict
 from datetime import datetime
 from time import sleep
 from loguru import logger
@@ -66,7 +67,7 @@ class DiscordParser:
     def save_messages(self, messages, filename='messages.json'):
         """Save messages to JSON file"""
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump([msg.__dict__ for msg in messages], f, indent=2, default=str)
+            json.dump([asdict(msg) for msg in messages], f, indent=2, default=str)
         logger.success(f"Saved {len(messages)} messages to {filename}")
 
 if __name__ == '__main__':